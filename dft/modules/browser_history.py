@@ -1,62 +1,269 @@
+import numbers
 import sqlite3
 import os
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from dft.utils.exporter import export_table
+from dft.utils.files import iter_files
 from dft.utils.logger import logger
 
-def parse_browser_history(db_path):
+# Rows fetched from SQLite and converted per batch
+BATCH_SIZE = 10000
+
+# Chrome/Edge store time as microseconds since Jan 1, 1601 UTC
+_WEBKIT_EPOCH = datetime(1601, 1, 1)
+_UNIX_EPOCH_OFFSET_US = int((datetime(1970, 1, 1) - _WEBKIT_EPOCH).total_seconds()) * 1000000
+# Range representable by datetime, outside of which the raw value is kept
+_WEBKIT_MIN_US = int((datetime.min - _WEBKIT_EPOCH).total_seconds()) * 1000000
+_WEBKIT_MAX_US = int((datetime.max - _WEBKIT_EPOCH).total_seconds()) * 1000000
+
+# Extractable tables: SELECT/FROM clause, output columns, WebKit time columns,
+# and the SQL expressions the time and URL filters apply to
+_TABLES = {
+    'urls': {
+        'select': """SELECT urls.url, urls.title, urls.visit_count, COALESCE(urls.last_visit_time, 0)
+        FROM urls""",
+        'columns': ['url', 'title', 'visit_count', 'last_visit_time'],
+        'times': ['last_visit_time'],
+        'time_filter': 'urls.last_visit_time',
+        'url_filter': 'urls.url',
+    },
+    'visits': {
+        'select': """SELECT urls.url, urls.title, COALESCE(visits.visit_time, 0), visits.from_visit,
+            visits.transition, visits.visit_duration
+        FROM visits JOIN urls ON urls.id = visits.url""",
+        'columns': ['url', 'title', 'visit_time', 'from_visit', 'transition', 'visit_duration'],
+        'times': ['visit_time'],
+        'time_filter': 'visits.visit_time',
+        'url_filter': 'urls.url',
+    },
+    'downloads': {
+        # The last entry of the redirect chain is the URL the file came from
+        'select': """SELECT chains.url, downloads.target_path, COALESCE(downloads.start_time, 0),
+            COALESCE(downloads.end_time, 0), downloads.received_bytes, downloads.total_bytes,
+            downloads.state, downloads.referrer, downloads.mime_type
+        FROM downloads LEFT JOIN downloads_url_chains AS chains
+            ON chains.id = downloads.id
+            AND chains.chain_index = (SELECT MAX(chain_index) FROM downloads_url_chains WHERE id = downloads.id)""",
+        'columns': ['url', 'target_path', 'start_time', 'end_time', 'received_bytes', 'total_bytes',
+                    'state', 'referrer', 'mime_type'],
+        'times': ['start_time', 'end_time'],
+        'time_filter': 'downloads.start_time',
+        'url_filter': 'chains.url',
+    },
+    'keyword_search_terms': {
+        'select': """SELECT keyword_search_terms.term, urls.url, urls.title, COALESCE(urls.last_visit_time, 0)
+        FROM keyword_search_terms JOIN urls ON urls.id = keyword_search_terms.url_id""",
+        'columns': ['term', 'url', 'title', 'last_visit_time'],
+        'times': ['last_visit_time'],
+        'time_filter': 'urls.last_visit_time',
+        'url_filter': 'urls.url',
+    },
+}
+
+# Firefox places.sqlite equivalents. PRTime (microseconds since 1970) is
+# shifted to WebKit time in SQL so rows convert like Chrome's; time filter
+# bounds are shifted back by time_offset so the filter stays indexable.
+_FIREFOX_TABLES = {
+    'urls': {
+        'select': f"""SELECT moz_places.url, moz_places.title, moz_places.visit_count,
+            COALESCE(moz_places.last_visit_date + {_UNIX_EPOCH_OFFSET_US}, 0)
+        FROM moz_places""",
+        'columns': _TABLES['urls']['columns'],
+        'times': ['last_visit_time'],
+        'time_filter': 'moz_places.last_visit_date',
+        'time_offset': _UNIX_EPOCH_OFFSET_US,
+        'url_filter': 'moz_places.url',
+    },
+    'visits': {
+        'select': f"""SELECT moz_places.url, moz_places.title,
+            COALESCE(moz_historyvisits.visit_date + {_UNIX_EPOCH_OFFSET_US}, 0),
+            moz_historyvisits.from_visit, moz_historyvisits.visit_type, NULL
+        FROM moz_historyvisits JOIN moz_places ON moz_places.id = moz_historyvisits.place_id""",
+        'columns': _TABLES['visits']['columns'],
+        'times': ['visit_time'],
+        'time_filter': 'moz_historyvisits.visit_date',
+        'time_offset': _UNIX_EPOCH_OFFSET_US,
+        'url_filter': 'moz_places.url',
+    },
+}
+
+# File names of history databases picked up by sweep_browser_history
+HISTORY_FILENAMES = ('History', 'places.sqlite')
+_SQLITE_HEADER = b'SQLite format 3\x00'
+
+def webkit_to_datetime(values):
+    """
+    Converts WebKit timestamps (microseconds since 1601) to datetime64[us]
+    in one vectorized step. Zero and out-of-range values become NaT.
+
+    Args:
+        values (array-like): Integer timestamps.
+
+    Returns:
+        numpy.ndarray: datetime64[us] array.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    valid = (values != 0) & (values >= _WEBKIT_MIN_US) & (values <= _WEBKIT_MAX_US)
+    converted = np.where(valid, values - _UNIX_EPOCH_OFFSET_US, 0).astype('datetime64[us]')
+    converted[~valid] = np.datetime64('NaT')
+    return converted
+
+def _format_times(raw, converted):
+    """
+    Formats converted timestamps as 'YYYY-MM-DD HH:MM:SS' strings: 'N/A' for
+    zero and the raw number for values outside the datetime range.
+    """
+    text = np.char.replace(np.datetime_as_string(converted, unit='s'), 'T', ' ').astype(object)
+    missing = np.isnat(converted)
+    text[missing] = np.where(raw[missing] == 0, 'N/A', raw[missing].astype(str))
+    return text
+
+def datetime_to_webkit(value):
+    """
+    Converts a datetime or date string (naive values are UTC) to a WebKit
+    timestamp. Integers are taken to be WebKit timestamps already.
+    """
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    # Stdlib arithmetic: 1601 is outside the nanosecond Timedelta range of pandas 2
+    return (ts.to_pydatetime() - _WEBKIT_EPOCH) // timedelta(microseconds=1)
+
+def _table_spec(conn, table):
+    """Returns the query spec of table for a Chrome/Edge or Firefox history database."""
+    firefox = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'moz_places'").fetchone()
+    tables = _FIREFOX_TABLES if firefox else _TABLES
+    if table not in tables:
+        raise ValueError(f"History table {table} is not available in {'Firefox' if firefox else 'Chrome'} history")
+    return tables[table]
+
+def _build_query(spec, start=None, end=None, domain=None, url_pattern=None, limit=None):
+    """
+    Compiles the filters into SQL so SQLite does the filtering.
+
+    Returns:
+        tuple: (query, parameters)
+    """
+    where = []
+    params = []
+    time_offset = spec.get('time_offset', 0)
+    if start is not None:
+        where.append(f"{spec['time_filter']} >= ?")
+        params.append(datetime_to_webkit(start) - time_offset)
+    if end is not None:
+        where.append(f"{spec['time_filter']} <= ?")
+        params.append(datetime_to_webkit(end) - time_offset)
+    if domain is not None:
+        # The host itself or any subdomain, with or without a port
+        domain = domain.lower().strip('.')
+        where.append(f"({spec['url_filter']} GLOB ? OR {spec['url_filter']} GLOB ? OR {spec['url_filter']} GLOB ?)")
+        params += [f"*://{domain}[/:]*", f"*://*.{domain}[/:]*", f"*://{domain}"]
+    if url_pattern is not None:
+        where.append(f"{spec['url_filter']} LIKE ?")
+        params.append(url_pattern)
+
+    query = spec['select']
+    if where:
+        query += "\n        WHERE " + " AND ".join(where)
+    query += f"\n        ORDER BY {spec['time_filter']} DESC"
+    if limit is not None:
+        query += "\n        LIMIT ?"
+        params.append(int(limit))
+    return query, params
+
+def _history_frame(rows, as_dataframe, spec):
+    """Converts a batch of rows of one of the extractable tables."""
+    columns = dict(zip(spec['columns'], zip(*rows) if rows else [()] * len(spec['columns'])))
+    for name in spec['times']:
+        raw = np.array(columns[name], dtype=np.int64)
+        converted = webkit_to_datetime(raw)
+        columns[name] = converted if as_dataframe else _format_times(raw, converted)
+
+    if as_dataframe:
+        return pd.DataFrame(columns, columns=spec['columns'])
+    return [dict(zip(spec['columns'], entry)) for entry in zip(*columns.values())]
+
+def iter_browser_history(db_path, batch_size=BATCH_SIZE, as_dataframe=False, table='urls',
+                         start=None, end=None, domain=None, url_pattern=None, limit=None):
+    """
+    Streams a Chrome/Edge (or Firefox) history database in batches with fetchmany, so
+    memory stays bounded by the batch size. Filters are compiled into the
+    SQL query, so only matching rows are read into Python.
+
+    Args:
+        db_path (str): Path to the 'History' file.
+        batch_size (int): Rows fetched and converted at a time.
+        as_dataframe (bool): Yield DataFrames with datetime64 time columns
+            instead of lists of dicts.
+        table (str): 'urls', 'visits', 'downloads' or 'keyword_search_terms'
+            (Firefox: 'urls' and 'visits').
+        start, end: Inclusive time window (datetime, date string in UTC, or
+            raw WebKit timestamp) on the table's main time column.
+        domain (str): Only URLs on this host or its subdomains.
+        url_pattern (str): SQL LIKE pattern the URL must match.
+        limit (int): Maximum number of rows, most recent first.
+
+    Yields:
+        list or DataFrame: Batches of history entries.
+
+    Raises:
+        sqlite3.Error: If the database cannot be read.
+    """
+    if table not in _TABLES:
+        raise ValueError(f"Unknown history table: {table}")
+
+    # Note: Browser must be closed or the database snapshotted (see snapshot_history_db) to avoid locks
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        spec = _table_spec(conn, table)
+        query, params = _build_query(spec, start, end, domain, url_pattern, limit)
+        cursor = conn.cursor()
+        cursor.arraysize = batch_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield _history_frame(rows, as_dataframe, spec)
+    finally:
+        conn.close()
+
+def parse_browser_history(db_path, as_dataframe=False, batch_size=BATCH_SIZE, table='urls',
+                          start=None, end=None, domain=None, url_pattern=None, limit=None):
     """
-    Parses a Chrome/Edge history SQLite database.
+    Parses a Chrome/Edge (or Firefox places.sqlite) history SQLite database.
 
     Args:
         db_path (str): Path to the 'History' file.
+        as_dataframe (bool): Return a DataFrame (with 'last_visit_time' as
+            datetime64) instead of a list of dictionaries.
+        batch_size (int): Rows fetched and converted at a time.
+        table (str): 'urls' (default), 'visits', 'downloads' or 'keyword_search_terms'.
+        start, end, domain, url_pattern, limit: SQL filters, see iter_browser_history.
 
     Returns:
-        list: A list of dictionaries containing 'url', 'title', 'visit_count', 'last_visit_time'.
+        list: A list of dictionaries containing 'url', 'title', 'visit_count', 'last_visit_time'
+        (or the columns of the requested table), or a DataFrame if as_dataframe is True.
     """
     if not os.path.isfile(db_path):
         logger.error(f"File not found: {db_path}")
         return None
 
     try:
-        # Connect to the database
-        # Note: Browser must be closed or file copied to temp location to avoid locks
-        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        cursor = conn.cursor()
-
-        # Chrome/Edge store time as microseconds since Jan 1, 1601 UTC
-        query = """
-        SELECT urls.url, urls.title, urls.visit_count, urls.last_visit_time
-        FROM urls
-        ORDER BY urls.last_visit_time DESC
-        """
-        
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        history_data = []
-        for row in rows:
-            url, title, visit_count, last_visit_time = row
-            
-            # Convert timestamp
-            if last_visit_time:
-                try:
-                    # Windows filetime to datetime
-                    dt = datetime(1601, 1, 1) + timedelta(microseconds=last_visit_time)
-                    time_str = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    time_str = str(last_visit_time)
-            else:
-                time_str = "N/A"
+        batches = list(iter_browser_history(db_path, batch_size, as_dataframe, table,
+                                            start, end, domain, url_pattern, limit))
+        if as_dataframe:
+            history_data = pd.concat(batches, ignore_index=True) if batches else _history_frame([], True, _TABLES[table])
+        else:
+            history_data = [entry for batch in batches for entry in batch]
 
-            history_data.append({
-                'url': url,
-                'title': title,
-                'visit_count': visit_count,
-                'last_visit_time': time_str
-            })
-
-        conn.close()
         logger.info(f"Parsed {len(history_data)} history entries from {db_path}")
         return history_data
 
@@ -67,18 +274,162 @@ def parse_browser_history(db_path):
         logger.error(f"Error parsing history {db_path}: {e}")
         return None
 
-def export_history_csv(history_data, output_path):
+def snapshot_history_db(db_path, snapshot_path):
     """
-    Exports browser history data to CSV.
+    Takes a consistent copy of a history database that may be in use.
+
+    The database and its -wal/-journal files are copied as plain files,
+    which never waits on SQLite locks (Chrome keeps History exclusively
+    locked while running). The copy is then written to snapshot_path with the
+    SQLite backup API, which applies the WAL or rolls back a hot journal, so
+    the snapshot is a single self-contained file.
+
+    Args:
+        db_path (str): Path to the history database.
+        snapshot_path (str): Path of the snapshot to write.
+
+    Returns:
+        bool: True if the snapshot was written, False otherwise.
     """
-    if not history_data:
-        return False
-    
     try:
-        df = pd.DataFrame(history_data)
-        df.to_csv(output_path, index=False)
-        logger.info(f"History data exported to {output_path}")
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(snapshot_path))) as tmp_dir:
+            raw_copy = os.path.join(tmp_dir, os.path.basename(db_path))
+            shutil.copyfile(db_path, raw_copy)
+            for suffix in ('-wal', '-journal'):
+                if os.path.isfile(db_path + suffix):
+                    shutil.copyfile(db_path + suffix, raw_copy + suffix)
+
+            source = sqlite3.connect(raw_copy, timeout=0)
+            target = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
         return True
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Could not snapshot {db_path}: {e}")
+        return False
+
+def find_history_dbs(root):
+    """
+    Finds browser history databases (Chrome/Edge/Brave 'History' and
+    Firefox 'places.sqlite' files) under a directory tree.
+
+    Returns:
+        list: Paths of the databases, in sorted walk order.
+    """
+    found = []
+    for path in iter_files(root, lambda name: name in HISTORY_FILENAMES):
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER:
+                    found.append(path)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable history file {path}: {e}")
+    return found
+
+def _sweep_one(args):
+    """Worker for sweep_browser_history: snapshots and parses one database."""
+    db_path, profile, snapshot_path, kwargs = args
+    if not snapshot_history_db(db_path, snapshot_path):
+        return None
+    try:
+        df = parse_browser_history(snapshot_path, as_dataframe=True, **kwargs)
+    finally:
+        os.remove(snapshot_path)
+    if df is None:
+        return None
+    df.insert(0, 'profile', profile)
+    df.insert(1, 'source', db_path)
+    return df
+
+def sweep_browser_history(root, workers=None, table='urls', start=None, end=None, domain=None,
+                          url_pattern=None, limit=None, tmp_dir=None):
+    """
+    Parses every browser profile under a directory tree (e.g. a collected
+    user directory) in one pass.
+
+    Each history database is snapshotted into a temporary directory (see
+    snapshot_history_db), so databases locked by a running browser are read
+    without waiting, and the snapshots are parsed on a process pool.
+
+    Args:
+        root (str): Directory to search for history databases.
+        workers (int): Worker processes; defaults to the number of CPUs.
+        table (str): Table to extract, see iter_browser_history.
+        start, end, domain, url_pattern, limit: SQL filters applied to each
+            database, see iter_browser_history.
+        tmp_dir (str): Where to place the snapshots; defaults to the system
+            temporary directory.
+
+    Returns:
+        DataFrame: Rows of all profiles, most recent first, with 'profile'
+        (the database's directory relative to root) and 'source' columns.
+        None if no database could be parsed.
+    """
+    if not os.path.isdir(root):
+        logger.error(f"Directory not found: {root}")
+        return None
+
+    db_paths = find_history_dbs(root)
+    if not db_paths:
+        logger.error(f"No browser history databases found under {root}")
+        return None
+
+    kwargs = {'table': table, 'start': start, 'end': end, 'domain': domain,
+              'url_pattern': url_pattern, 'limit': limit}
+    try:
+        with tempfile.TemporaryDirectory(prefix='dft_history_', dir=tmp_dir) as snapshot_dir:
+            jobs = [(path, os.path.relpath(os.path.dirname(path), root),
+                     os.path.join(snapshot_dir, f"{i}.sqlite"), kwargs) for i, path in enumerate(db_paths)]
+            workers = min(workers or os.cpu_count() or 1, len(jobs))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    frames = list(pool.map(_sweep_one, jobs))
+            else:
+                frames = [_sweep_one(job) for job in jobs]
     except Exception as e:
-        logger.error(f"Error exporting history CSV: {e}")
+        logger.error(f"Error sweeping browser history under {root}: {e}")
+        return None
+
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        return None
+
+    merged = pd.concat(frames, ignore_index=True)
+    time_column = _TABLES[table]['times'][0]
+    merged = merged.sort_values(time_column, ascending=False, kind='stable', ignore_index=True)
+    logger.info(f"Parsed {len(merged)} history entries from {len(frames)} of {len(db_paths)} profiles under {root}")
+    return merged
+
+def export_history(history_data, output_path, fmt=None, compression=None):
+    """
+    Exports browser history in chunks to CSV, Parquet or Feather.
+
+    Args:
+        history_data: List of dicts, DataFrame, or an iterable of batches
+            such as iter_browser_history(..., as_dataframe=True), which is
+            written batch by batch as it is read.
+        output_path (str): Destination file.
+        fmt (str): 'csv', 'parquet' or 'feather'; by default taken from the
+            file extension (see dft.utils.exporter.export_table).
+        compression (str): Codec override.
+
+    Returns:
+        bool: True if successful, False on error or if there was no history to export.
+    """
+    if history_data is None or (isinstance(history_data, (list, pd.DataFrame)) and len(history_data) == 0):
+        return False
+
+    # A batch stream may turn out to be empty only once it is consumed
+    if not export_table(history_data, output_path, fmt, compression):
         return False
+    logger.info(f"History data exported to {output_path}")
+    return True
+
+def export_history_csv(history_data, output_path):
+    """
+    Exports browser history data to CSV.
+    """
+    return export_history(history_data, output_path, 'csv')
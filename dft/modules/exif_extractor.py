@@ -1,14 +1,376 @@
 from PIL import Image
-from PIL.ExifTags import TAGS
+from PIL.ExifTags import TAGS, GPSTAGS
+from PIL.TiffImagePlugin import IFDRational
+import math
 import os
+import struct
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from dft.utils.files import bounded_map, iter_files
 from dft.utils.logger import logger
 
-def extract_exif(image_path):
+# File extensions treated as images when walking directories
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.jpe', '.tif', '.tiff', '.dng', '.nef', '.cr2', '.arw',
+                    '.png', '.webp', '.heic', '.heif')
+
+# Files handed to a worker process per task, to amortize inter-process overhead
+BATCH_CHUNK = 64
+
+_IMAGE_MAGICS = (b'\xff\xd8\xff', b'II*\x00', b'MM\x00*', b'\x89PNG\r\n\x1a\n')
+_HEIF_BRANDS = (b'heic', b'heix', b'heim', b'heis', b'mif1', b'msf1')
+
+# Bytes read up front by the header parser; the EXIF IFDs of JPEG, PNG and
+# WebP files are usually within it, anything further is read as needed
+HEADER_READ = 4 * 1024
+
+# Sanity limits for the header parser on corrupt files
+_MAX_IFD_ENTRIES = 1024
+_MAX_VALUE_SIZE = 16 * 1024 * 1024
+
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+
+# TIFF field types: struct code, size of one value
+_TIFF_TYPES = {
+    1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('L', 8), 6: ('b', 1),
+    7: ('s', 1), 8: ('h', 2), 9: ('l', 4), 10: ('l', 8), 11: ('f', 4), 12: ('d', 8), 13: ('L', 4),
+}
+
+def _has_image_magic(path):
+    """Checks the first bytes of a file for a JPEG, TIFF, PNG, WebP or HEIF signature."""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    return (head.startswith(_IMAGE_MAGICS)
+            or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+            or (head[4:8] == b'ftyp' and head[8:12] in _HEIF_BRANDS))
+
+def _buffer_reader(buffer):
+    """Returns read(offset, size) over an in-memory buffer, raising on truncation."""
+    def read(offset, size):
+        if offset < 0 or offset + size > len(buffer):
+            raise ValueError("EXIF data is truncated")
+        return buffer[offset:offset + size]
+    return read
+
+def _file_reader(f, head):
+    """Returns read(offset, size) over a file, served from head when possible."""
+    def read(offset, size):
+        if offset + size <= len(head):
+            return head[offset:offset + size]
+        f.seek(offset)
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("EXIF data is truncated")
+        return data
+    return read
+
+def _tiff_value(field_type, data, count, endian):
+    """Decodes a TIFF field the way Pillow does: str, bytes, a scalar or a tuple."""
+    if field_type == 2:
+        if data.endswith(b'\x00'):
+            data = data[:-1]
+        return data.decode('latin-1', 'replace')
+    if field_type in (1, 7):
+        return data
+
+    code, size = _TIFF_TYPES[field_type]
+    if field_type in (5, 10):
+        numbers = struct.unpack(f"{endian}{count * 2}{code}", data)
+        values = tuple(num / den if den else math.nan for num, den in zip(numbers[::2], numbers[1::2]))
+    else:
+        values = struct.unpack(f"{endian}{count}{code}", data)
+    return values[0] if count == 1 else values
+
+def _parse_tiff(read, base):
+    """
+    Parses the TIFF structure at offset base: IFD0 merged with the Exif
+    IFD, and the GPS IFD as a nested dict under its pointer tag, keyed by
+    numeric tag like Pillow's _getexif.
+    """
+    header = read(base, 8)
+    endian = {b'II': '<', b'MM': '>'}.get(header[:2])
+    if endian is None:
+        raise ValueError("not a TIFF header")
+    magic, ifd0 = struct.unpack(endian + 'HI', header[2:])
+    if magic != 42:
+        raise ValueError("unsupported TIFF variant")
+
+    def parse_ifd(offset):
+        count = struct.unpack(endian + 'H', read(base + offset, 2))[0]
+        if count > _MAX_IFD_ENTRIES:
+            raise ValueError("implausible IFD entry count")
+        entries = read(base + offset + 2, count * 12)
+        tags = {}
+        for i in range(count):
+            tag, field_type, n, value = struct.unpack_from(endian + 'HHI4s', entries, i * 12)
+            if field_type not in _TIFF_TYPES or n == 0:
+                continue
+            size = _TIFF_TYPES[field_type][1] * n
+            if size > _MAX_VALUE_SIZE:
+                continue
+            if size <= 4:
+                data = value[:size]
+            else:
+                data = read(base + struct.unpack(endian + 'I', value)[0], size)
+            tags[tag] = _tiff_value(field_type, data, n, endian)
+        return tags
+
+    tags = parse_ifd(ifd0)
+    if isinstance(tags.get(_EXIF_IFD), int):
+        tags.update(parse_ifd(tags[_EXIF_IFD]))
+    if isinstance(tags.get(_GPS_IFD), int):
+        tags[_GPS_IFD] = parse_ifd(tags[_GPS_IFD])
+    return tags
+
+def _exif_payload(read, offset):
+    """Parses an EXIF payload that may start with the 'Exif\\0\\0' identifier."""
+    if read(offset, 6) == b'Exif\x00\x00':
+        offset += 6
+    return _parse_tiff(read, offset)
+
+def _jpeg_exif(read, size):
+    """Walks the JPEG marker segments up to the image data looking for an Exif APP1."""
+    pos = 2
+    while True:
+        if pos + 2 > size:
+            raise ValueError("truncated JPEG")
+        prefix, kind = read(pos, 2)
+        if prefix != 0xFF:
+            raise ValueError("corrupt JPEG marker")
+        if kind == 0xFF:
+            pos += 1
+            continue
+        if kind in (0xD9, 0xDA):
+            return {}
+        if 0xD0 <= kind <= 0xD7 or kind == 0x01:
+            pos += 2
+            continue
+        length = struct.unpack('>H', read(pos + 2, 2))[0]
+        # Parsed in place, so an embedded thumbnail is never read
+        if kind == 0xE1 and length >= 16 and read(pos + 4, 6) == b'Exif\x00\x00':
+            return _parse_tiff(read, pos + 10)
+        pos += 2 + length
+
+def _png_exif(read, size):
+    """Walks the PNG chunks looking for eXIf, skipping over image data."""
+    pos = 8
+    while pos + 8 <= size:
+        length, kind = struct.unpack('>I4s', read(pos, 8))
+        if kind == b'eXIf':
+            return _exif_payload(read, pos + 8)
+        if kind == b'IEND':
+            break
+        pos += 12 + length
+    return {}
+
+def _webp_exif(read, size):
+    """Walks the RIFF chunks of a WebP file looking for EXIF."""
+    pos = 12
+    while pos + 8 <= size:
+        kind, length = struct.unpack('<4sI', read(pos, 8))
+        if kind == b'EXIF':
+            return _exif_payload(read, pos + 8)
+        pos += 8 + length + (length & 1)
+    return {}
+
+def _iter_boxes(read, start, end):
+    """Yields (type, content start, end) of the ISO BMFF boxes between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack('>I4s', read(pos, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', read(pos + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ValueError("corrupt box")
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+def _heif_exif(read, size):
+    """
+    Finds the Exif item of a HEIF/HEIC file through the item info (iinf) and
+    location (iloc) boxes of its meta box.
+    """
+    meta = next((box for box in _iter_boxes(read, 0, size) if box[0] == b'meta'), None)
+    if meta is None:
+        raise ValueError("no meta box")
+    _, meta_start, meta_end = meta
+    if meta_end - meta_start > _MAX_VALUE_SIZE:
+        raise ValueError("implausible meta box size")
+    data = read(meta_start, meta_end - meta_start)
+    read_meta = _buffer_reader(data)
+
+    exif_id = None
+    locations = {}
+    for kind, start, end in _iter_boxes(read_meta, 4, len(data)):
+        if kind == b'iinf':
+            version = data[start]
+            first = start + (6 if version == 0 else 8)
+            for entry, entry_start, _ in _iter_boxes(read_meta, first, end):
+                version = data[entry_start]
+                if entry != b'infe' or version < 2:
+                    continue
+                id_size = 2 if version == 2 else 4
+                item_id = int.from_bytes(data[entry_start + 4:entry_start + 4 + id_size], 'big')
+                item_type = data[entry_start + 6 + id_size:entry_start + 10 + id_size]
+                if item_type == b'Exif':
+                    exif_id = item_id
+        elif kind == b'iloc':
+            locations = _heif_locations(data, start)
+
+    if exif_id is None:
+        return {}
+    if exif_id not in locations:
+        raise ValueError("Exif item has no file location")
+    offset, length = locations[exif_id]
+    tiff_offset = struct.unpack('>I', read(offset, 4))[0]
+    return _parse_tiff(read, offset + 4 + tiff_offset)
+
+def _heif_locations(data, pos):
+    """Parses an iloc box into {item id: (file offset, length)} of each item's first extent."""
+    version = data[pos]
+    offset_size, length_size = data[pos + 4] >> 4, data[pos + 4] & 0x0F
+    base_offset_size = data[pos + 5] >> 4
+    index_size = data[pos + 5] & 0x0F if version in (1, 2) else 0
+    pos += 6
+
+    def number(size):
+        nonlocal pos
+        value = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+        return value
+
+    locations = {}
+    for _ in range(number(2 if version < 2 else 4)):
+        item_id = number(2 if version < 2 else 4)
+        construction = number(2) & 0x0F if version in (1, 2) else 0
+        number(2)  # data reference index
+        base_offset = number(base_offset_size)
+        extents = []
+        for _ in range(number(2)):
+            number(index_size)
+            extents.append((base_offset + number(offset_size), number(length_size)))
+        if construction == 0 and extents:
+            locations[item_id] = extents[0]
+    return locations
+
+def _read_exif_header(image_path):
+    """
+    Reads EXIF straight from the file structure. Only the first HEADER_READ
+    bytes are read up front; structures that lie beyond them are read on
+    their own, skipping image data and thumbnails. Returns tags keyed by
+    numeric id ({} if the image has none), or None for formats it does not
+    handle.
+    """
+    with open(image_path, 'rb') as f:
+        head = f.read(HEADER_READ)
+        size = os.fstat(f.fileno()).st_size
+        read = _file_reader(f, head)
+        if head.startswith(b'\xff\xd8'):
+            return _jpeg_exif(read, size)
+        if head[:4] in (b'II*\x00', b'MM\x00*'):
+            return _parse_tiff(read, 0)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _png_exif(read, size)
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return _webp_exif(read, size)
+        if head[4:8] == b'ftyp' and head[8:12] in _HEIF_BRANDS:
+            return _heif_exif(read, size)
+    return None
+
+def _read_exif_pillow(image_path):
+    """Reads EXIF tags keyed by numeric id through Pillow."""
+    with Image.open(image_path) as image:
+        if hasattr(image, '_getexif'):
+            return image._getexif() or {}
+
+        # TIFF-based formats: flatten IFD0, the Exif IFD and GPS like _getexif does
+        exif = image.getexif()
+        exif_data = dict(exif)
+        exif_data.update(exif.get_ifd(_EXIF_IFD))
+        gps = exif.get_ifd(_GPS_IFD)
+        if gps:
+            exif_data[_GPS_IFD] = dict(gps)
+        return exif_data
+
+def _typed(value):
+    """Normalizes a tag value: rationals to float, bytes to str where decodable."""
+    if isinstance(value, IFDRational):
+        return float(value)
+    if isinstance(value, tuple):
+        return tuple(_typed(v) for v in value)
+    # Decode bytes to string if possible for readability
+    if isinstance(value, bytes):
+        try:
+            return value.decode()
+        except UnicodeDecodeError:
+            return value
+    return value
+
+def _read_exif(image_path, fast=True):
+    """
+    Returns the EXIF tags of an image as a dict ({} if it has none); raises
+    on error. The header parser is tried first, Pillow is the fallback.
+    """
+    exif_data = None
+    if fast:
+        try:
+            exif_data = _read_exif_header(image_path)
+        except (ValueError, struct.error, IndexError, KeyError):
+            exif_data = None
+    if exif_data is None:
+        exif_data = _read_exif_pillow(image_path)
+
+    exif_dict = {}
+    for tag_id, value in exif_data.items():
+        if tag_id == _GPS_IFD and isinstance(value, dict):
+            value = {GPSTAGS.get(gps_id, gps_id): _typed(gps_value) for gps_id, gps_value in value.items()}
+        else:
+            value = _typed(value)
+        exif_dict[TAGS.get(tag_id, tag_id)] = value
+    return exif_dict
+
+def gps_coordinates(exif):
+    """
+    Converts the GPSInfo of an extract_exif result to decimal degrees.
+
+    Returns:
+        tuple: (latitude, longitude), or None if the image has no usable GPS position.
+    """
+    gps = exif.get('GPSInfo') if exif else None
+    if not isinstance(gps, dict):
+        return None
+    try:
+        coordinates = []
+        for key in ('Latitude', 'Longitude'):
+            degrees, minutes, seconds = gps['GPS' + key]
+            value = degrees + minutes / 60 + seconds / 3600
+            if gps.get('GPS' + key + 'Ref') in ('S', 'W'):
+                value = -value
+            coordinates.append(value)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if any(math.isnan(value) for value in coordinates):
+        return None
+    return tuple(coordinates)
+
+def extract_exif(image_path, fast=True):
     """
     Extracts EXIF metadata from an image file.
 
+    By default the EXIF block is read directly from the file structure
+    (JPEG APP1, TIFF/DNG IFDs, PNG eXIf, WebP EXIF, HEIF Exif item) without
+    decoding the image; Pillow is used for anything the parser cannot read.
+    Rationals are returned as floats and GPSInfo as a dict keyed by GPS tag
+    name (see gps_coordinates).
+
     Args:
         image_path (str): Path to the image file.
+        fast (bool): Try the header parser before Pillow.
 
     Returns:
         dict: A dictionary of EXIF tags and values, or None if no EXIF data found or error.
@@ -18,27 +380,93 @@ def extract_exif(image_path):
         return None
 
     try:
-        image = Image.open(image_path)
-        exif_data = image._getexif()
-
-        if not exif_data:
+        exif_dict = _read_exif(image_path, fast)
+        if not exif_dict:
             logger.info(f"No EXIF data found in {image_path}")
             return {}
 
-        exif_dict = {}
-        for tag_id, value in exif_data.items():
-            tag_name = TAGS.get(tag_id, tag_id)
-            # Decode bytes to string if possible for readability
-            if isinstance(value, bytes):
-                try:
-                    value = value.decode()
-                except:
-                    pass
-            exif_dict[tag_name] = value
-            
         logger.info(f"EXIF data extracted from {image_path}")
         return exif_dict
 
     except Exception as e:
         logger.error(f"Error extracting EXIF from {image_path}: {e}")
         return None
+
+def _image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def iter_images(paths, match='extension'):
+    """
+    Yields candidate image paths from a mix of files and directories, in the
+    order extract_exif_batch visits them. Files found in directories are
+    filtered by extension unless match is 'magic', in which case every file
+    is yielded and the workers check their signatures instead.
+    """
+    return iter_files(paths, None if match == 'magic' else _image_name)
+
+def _extract_chunk(paths, check_magic, include_rejected=False):
+    """Worker for extract_exif_batch: extracts EXIF from a list of files."""
+    results = []
+    for path in paths:
+        try:
+            if check_magic and not _has_image_magic(path):
+                if include_rejected:
+                    results.append((path, False))
+                continue
+            results.append((path, _read_exif(path)))
+        except Exception as e:
+            logger.error(f"Error extracting EXIF from {path}: {e}")
+            results.append((path, None))
+    return results
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def extract_exif_batch(paths, workers=None, match='extension', chunk_size=BATCH_CHUNK, include_rejected=False):
+    """
+    Extracts EXIF metadata from many images on a process pool. Files are
+    handed to the workers in chunks of chunk_size, at most two chunks per
+    worker at a time (see dft.utils.files.bounded_map).
+
+    Args:
+        paths (str or list): A file or directory, or a list of them.
+            Directories are walked recursively.
+        workers (int): Worker processes; defaults to the number of CPUs.
+        match (str): How files found in directories are selected:
+            'extension' (IMAGE_EXTENSIONS) or 'magic' (file signature).
+        chunk_size (int): Files per worker task.
+        include_rejected (bool): Also yield (path, False) for files that
+            fail the 'magic' signature check, which are otherwise dropped.
+
+    Yields:
+        tuple: (path, exif) in completion order, where exif is the result of
+            extract_exif ({} without EXIF, None if the file could not be read).
+    """
+    if match not in ('extension', 'magic'):
+        raise ValueError(f"Unknown match mode: {match}")
+    workers = workers or os.cpu_count() or 1
+
+    extracted = 0
+    extract = partial(_extract_chunk, check_magic=match == 'magic', include_rejected=include_rejected)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = _chunked(iter_images(paths, match), chunk_size)
+        for _, results in bounded_map(pool, extract, chunks, workers * 2):
+            extracted += sum(exif is not False for _, exif in results)
+            yield from results
+
+    logger.info(f"Batch EXIF extraction complete: {extracted} files")
+
+def exif_to_dataframe(results):
+    """
+    Collects (path, exif) results, e.g. from extract_exif_batch, into a
+    DataFrame with a 'path' column and one column per tag. Files that could
+    not be read are left out.
+    """
+    return pd.DataFrame.from_records([{'path': path, **exif} for path, exif in results if exif is not None])
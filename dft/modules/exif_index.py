@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from dft.modules.exif_extractor import BATCH_CHUNK, extract_exif_batch, gps_coordinates, iter_images
+from dft.utils.logger import logger
+
+# EXIF date/time values look like '2023:11:28 21:01:40'
+_EXIF_TIME = re.compile(r'(\d{4}):(\d{2}):(\d{2})[ T](\d{2}):(\d{2}):(\d{2})')
+
+_COLUMNS = ('path', 'make', 'model', 'taken', 'latitude', 'longitude')
+
+def _taken(exif):
+    """Returns the capture time of an image as 'YYYY-MM-DD HH:MM:SS', or None."""
+    for tag in ('DateTimeOriginal', 'DateTimeDigitized', 'DateTime'):
+        match = _EXIF_TIME.match(str(exif.get(tag) or ''))
+        if match and match.group(1) != '0000':
+            year, month, day, hour, minute, second = match.groups()
+            return f"{year}-{month}-{day} {hour}:{minute}:{second}"
+    return None
+
+def _text(value):
+    """Cleans a Make/Model value, which cameras often pad with spaces or NULs."""
+    if not isinstance(value, str):
+        return None
+    return value.strip(' \x00') or None
+
+def _time_bound(value, end=False):
+    """
+    Converts a query bound (datetime, date or ISO string) to the stored text
+    format; a bare date as the end bound covers that whole day.
+    """
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    value = str(value).replace('T', ' ')
+    if end and len(value) == 10:
+        value += ' 23:59:59'
+    return value
+
+def _json_value(value):
+    return value.hex() if isinstance(value, bytes) else str(value)
+
+class ExifIndex:
+    """
+    On-disk SQLite index of extracted EXIF metadata for querying photo
+    collections by camera, capture time and GPS position. Camera and time
+    columns have B-tree indexes and GPS positions an R*Tree, so queries
+    take milliseconds on millions of images. Files are keyed by path and
+    re-extracted by update() only when their size or mtime changes; files
+    that update(match='magic') found not to be images are remembered the
+    same way, in a separate table, so they are not sniffed again.
+    """
+
+    # Writes are committed in batches; a crash only loses index entries
+    COMMIT_EVERY = 1000
+
+    def __init__(self, db_path):
+        self._pending = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS photos (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime_ns INTEGER,
+                make TEXT COLLATE NOCASE, model TEXT COLLATE NOCASE, taken TEXT,
+                latitude REAL, longitude REAL, exif TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS photos_taken ON photos (taken)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS photos_make_model ON photos (make, model, taken)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS photos_model ON photos (model, taken)")
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS photos_gps USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rejected (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)"
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+
+    def is_current(self, path, st=None):
+        """
+        Returns True if path is indexed, or recorded as not an image, with
+        its current size and mtime.
+        """
+        st = st or os.stat(path)
+        path = os.path.abspath(path)
+        row = (self.conn.execute("SELECT size, mtime_ns FROM photos WHERE path = ?", (path,)).fetchone()
+               or self.conn.execute("SELECT size, mtime_ns FROM rejected WHERE path = ?", (path,)).fetchone())
+        return row == (st.st_size, st.st_mtime_ns)
+
+    def add(self, path, exif, st=None):
+        """
+        Indexes the extract_exif result for a file, replacing any earlier
+        entry. exif may be {} (no EXIF) or None (unreadable); such files are
+        still recorded so unchanged ones are skipped on re-index.
+        """
+        st = st or os.stat(path)
+        path = os.path.abspath(path)
+        exif = exif or {}
+        position = gps_coordinates(exif)
+        if position and not (-90 <= position[0] <= 90 and -180 <= position[1] <= 180):
+            position = None
+        latitude, longitude = position or (None, None)
+
+        self.conn.execute("DELETE FROM photos_gps WHERE id = (SELECT id FROM photos WHERE path = ?)", (path,))
+        self.conn.execute("DELETE FROM rejected WHERE path = ?", (path,))
+        cursor = self.conn.execute(
+            "INSERT OR REPLACE INTO photos (path, size, mtime_ns, make, model, taken, latitude, longitude, exif) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, st.st_size, st.st_mtime_ns, _text(exif.get('Make')), _text(exif.get('Model')), _taken(exif),
+             latitude, longitude, json.dumps(exif, default=_json_value) if exif else None)
+        )
+        if position:
+            self.conn.execute("INSERT INTO photos_gps VALUES (?, ?, ?, ?, ?)",
+                              (cursor.lastrowid, latitude, latitude, longitude, longitude))
+        self._written()
+
+    def reject(self, path, st=None):
+        """
+        Records that a file is not an image, replacing any earlier entry, so
+        update() skips it until its size or mtime changes.
+        """
+        st = st or os.stat(path)
+        path = os.path.abspath(path)
+        self.conn.execute("DELETE FROM photos_gps WHERE id = (SELECT id FROM photos WHERE path = ?)", (path,))
+        self.conn.execute("DELETE FROM photos WHERE path = ?", (path,))
+        self.conn.execute("INSERT OR REPLACE INTO rejected VALUES (?, ?, ?)", (path, st.st_size, st.st_mtime_ns))
+        self._written()
+
+    def remove(self, path):
+        """Drops the entry for path, if any."""
+        path = os.path.abspath(path)
+        self.conn.execute("DELETE FROM photos_gps WHERE id = (SELECT id FROM photos WHERE path = ?)", (path,))
+        self.conn.execute("DELETE FROM photos WHERE path = ?", (path,))
+        self.conn.execute("DELETE FROM rejected WHERE path = ?", (path,))
+        self.conn.commit()
+
+    def prune(self):
+        """
+        Drops entries for files that no longer exist.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        missing = [path for (path,) in self.conn.execute("SELECT path FROM photos UNION SELECT path FROM rejected")
+                   if not os.path.exists(path)]
+        for path in missing:
+            self.remove(path)
+        return len(missing)
+
+    def update(self, paths, workers=None, match='extension', chunk_size=BATCH_CHUNK):
+        """
+        Extracts and indexes EXIF for new or changed images with
+        extract_exif_batch; files whose size and mtime are unchanged since
+        they were indexed, or rejected as non-images, are skipped without
+        being opened.
+
+        Args:
+            paths (str or list): A file or directory, or a list of them.
+            workers (int): Worker processes; defaults to the number of CPUs.
+            match (str): 'extension' or 'magic', as for extract_exif_batch.
+            chunk_size (int): Files per worker task.
+
+        Returns:
+            int: Number of files (re)indexed, or None if an error occurs.
+        """
+        stats = {}
+        skipped = 0
+
+        def changed():
+            nonlocal skipped
+            for path in iter_images(paths, match):
+                try:
+                    st = os.stat(path)
+                except OSError as e:
+                    logger.error(f"Cannot stat {path}: {e}")
+                    continue
+                if self.is_current(path, st):
+                    skipped += 1
+                    continue
+                stats[path] = st
+                yield path
+
+        indexed = 0
+        try:
+            for path, exif in extract_exif_batch(changed(), workers=workers, match=match,
+                                                 chunk_size=chunk_size, include_rejected=True):
+                # A path listed twice is extracted twice; the stat is only kept once
+                st = stats.pop(path, None)
+                if exif is False:
+                    self.reject(path, st)
+                    continue
+                self.add(path, exif, st)
+                indexed += 1
+        except Exception as e:
+            logger.error(f"Error updating EXIF index: {e}")
+            return None
+        finally:
+            self.conn.commit()
+
+        logger.info(f"EXIF index updated: {indexed} files indexed, {skipped} unchanged")
+        return indexed
+
+    def query(self, make=None, model=None, start=None, end=None, bbox=None, limit=None, as_dataframe=False):
+        """
+        Finds indexed images matching all of the given criteria.
+
+        Args:
+            make (str): Camera make, matched case-insensitively.
+            model (str): Camera model, matched case-insensitively.
+            start: Earliest capture time (datetime, date or ISO string), inclusive.
+            end: Latest capture time (datetime, date or ISO string), inclusive.
+            bbox (tuple): (min_lat, min_lon, max_lat, max_lon) in decimal
+                degrees; min_lon > max_lon selects a box across the antimeridian.
+            limit (int): Maximum number of results.
+            as_dataframe (bool): Return a pandas DataFrame instead of a list.
+
+        Returns:
+            list or DataFrame: path, make, model, taken, latitude and longitude
+                of each match, ordered by capture time.
+        """
+        source = "photos p"
+        conditions = []
+        params = []
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            # CROSS JOIN makes the R*Tree the outer loop; a make such as 'Apple'
+            # can match far more rows than a bounding box does. The R*Tree stores
+            # rounded 32-bit bounds, so it narrows the candidates and the exact
+            # coordinates decide.
+            source = "photos_gps g CROSS JOIN photos p ON p.id = g.id"
+            conditions.append("g.max_lat >= ? AND g.min_lat <= ? AND p.latitude BETWEEN ? AND ?")
+            params += [min_lat, max_lat, min_lat, max_lat]
+            if min_lon <= max_lon:
+                conditions.append("g.max_lon >= ? AND g.min_lon <= ? AND p.longitude BETWEEN ? AND ?")
+                params += [min_lon, max_lon, min_lon, max_lon]
+            else:
+                conditions.append("(p.longitude >= ? OR p.longitude <= ?)")
+                params += [min_lon, max_lon]
+        if make is not None:
+            conditions.append("p.make = ?")
+            params.append(make)
+        if model is not None:
+            conditions.append("p.model = ?")
+            params.append(model)
+        if start is not None:
+            conditions.append("p.taken >= ?")
+            params.append(_time_bound(start))
+        if end is not None:
+            conditions.append("p.taken <= ?")
+            params.append(_time_bound(end, end=True))
+
+        sql = f"SELECT {', '.join('p.' + column for column in _COLUMNS)} FROM {source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY p.taken, p.path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        rows = self.conn.execute(sql, params).fetchall()
+        if as_dataframe:
+            df = pd.DataFrame(rows, columns=list(_COLUMNS))
+            df['taken'] = pd.to_datetime(df['taken'])
+            return df
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def get(self, path):
+        """Returns the full stored EXIF dict for path, or None if it is not indexed."""
+        row = self.conn.execute("SELECT exif FROM photos WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]) if row[0] else {}
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
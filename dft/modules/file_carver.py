@@ -1,86 +1,627 @@
+import hashlib
+import json
+import mmap
 import os
+import re
+import struct
+import time
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from dft.utils.logger import logger
 
-def carve_files(binary_path, output_dir):
+# Default upper bound on the size of a single carved file
+MAX_FILE_SIZE = 10 * 1024 * 1024
+
+# Upper bound for formats whose end is found by walking their structure
+MAX_STRUCTURED_SIZE = 64 * 1024 * 1024
+
+# Size of the window each header search covers during a scan
+SCAN_WINDOW = 4 * 1024 * 1024
+
+# Size of the byte range each worker scans in parallel mode
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+# Name of the manifest written to the output directory in index-only and dedupe modes
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Directory under the output directory holding content-addressed payloads
+OBJECTS_DIR = 'objects'
+
+# Name of the checkpoint written to the output directory while carving
+CHECKPOINT_NAME = '.carve_checkpoint.json'
+
+# Bytes of image scanned between checkpoints
+CHECKPOINT_INTERVAL = 1024 * 1024 * 1024
+
+# A carvable file type.
+#   ext:      extension used for output names and result counts.
+#   headers:  tuple of byte strings that mark the start of a file.
+#   footer:   byte string that marks the end of a file (included in output).
+#   max_size: largest file that will be carved; footers further away are ignored.
+#   find_end: optional callable (data, start, limit) -> end offset or None,
+#             used instead of the footer search for formats that need it.
+#   after_footer: optional callable (data, footer_offset, limit) -> end offset
+#             or None, for formats whose data continues past the footer.
+Signature = namedtuple('Signature', ['ext', 'headers', 'footer', 'max_size', 'find_end', 'after_footer'],
+                       defaults=(None, MAX_FILE_SIZE, None, None))
+
+# Registry of signatures, keyed by extension
+SIGNATURES = {}
+
+def register_signature(signature):
     """
-    Carves JPG and PNG files from a binary file.
+    Adds a file type to the carving registry, replacing any existing
+    signature with the same extension.
+
+    Args:
+        signature (Signature): The file type definition.
+    """
+    if not signature.headers or (signature.footer is None and signature.find_end is None):
+        raise ValueError(f"Signature '{signature.ext}' needs headers and a footer or find_end")
+    SIGNATURES[signature.ext] = signature
+
+def _zip_end(data, eocd, limit):
+    """Ends a ZIP archive after its End Of Central Directory record and comment."""
+    if eocd + 22 > limit:
+        return None
+    comment_len = struct.unpack_from('<H', data, eocd + 20)[0]
+    end = eocd + 22 + comment_len
+    return end if end <= limit else None
+
+# A marker inside JPEG entropy-coded data: 0xFF not followed by a stuffed
+# zero byte, a restart marker or another fill byte
+_JPEG_MARKER = re.compile(b'\xFF[^\x00\xD0-\xD7\xFF]')
+
+def _jpeg_end(data, start, limit):
+    """
+    Ends a JPEG at its real EOI marker by walking the marker segments from
+    SOI, skipping over segment payloads (which may hold embedded thumbnails
+    with their own EOI) and entropy-coded scan data. Returns None for
+    anything that is not a well-formed JPEG within limit.
+    """
+    pos = start + 2
+    while pos + 2 <= limit:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+        elif marker == 0xD9:
+            return pos + 2
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers carry no length
+            pos += 2
+        elif marker in (0x00, 0xD8) or pos + 4 > limit:
+            return None
+        else:
+            length = struct.unpack_from('>H', data, pos + 2)[0]
+            if length < 2:
+                return None
+            pos += 2 + length
+
+            if marker == 0xDA:
+                # Skip entropy-coded data up to the next real marker
+                match = _JPEG_MARKER.search(data, pos, limit)
+                if match is None:
+                    return None
+                pos = match.start()
+    return None
+
+def _png_end(data, start, limit):
+    """
+    Ends a PNG after its IEND chunk by following the chunk lengths from the
+    signature and checking every chunk CRC on the way. Returns None for
+    anything that is not a well-formed PNG within limit.
+    """
+    with memoryview(data) as view:
+        pos = start + 8
+        while pos + 12 <= limit:
+            length, chunk_type = struct.unpack_from('>I4s', data, pos)
+            end = pos + 12 + length
+            if end > limit or not chunk_type.isalpha():
+                return None
+
+            crc = struct.unpack_from('>I', data, end - 4)[0]
+            if zlib.crc32(view[pos + 4:end - 4]) != crc:
+                return None
+
+            if chunk_type == b'IEND':
+                return end
+            pos = end
+    return None
+
+register_signature(Signature('jpg', (b'\xFF\xD8\xFF',), max_size=MAX_STRUCTURED_SIZE, find_end=_jpeg_end))
+register_signature(Signature('png', (b'\x89PNG\r\n\x1a\n',), max_size=MAX_STRUCTURED_SIZE, find_end=_png_end))
+register_signature(Signature('gif', (b'GIF87a', b'GIF89a'), b'\x00\x3B'))
+register_signature(Signature('pdf', (b'%PDF-',), b'%%EOF', max_size=50 * 1024 * 1024))
+register_signature(Signature('zip', (b'PK\x03\x04',), b'PK\x05\x06', max_size=50 * 1024 * 1024, after_footer=_zip_end))
+
+def _find_extent(sig, data, start, searched=None):
+    """
+    Returns the end offset of a file starting at start, or None.
+
+    searched maps extensions to a (lo, hi) range known to hold no footer
+    start and is updated in place. Candidates are found in offset order, so
+    a candidate inside that range resumes the footer search at hi instead of
+    rescanning up to max_size bytes; without it, every header of a truncated
+    archive would rescan the same footer-less region.
+    """
+    limit = min(len(data), start + sig.max_size)
+    if sig.find_end is not None:
+        return sig.find_end(data, start, limit)
+
+    search_from = lo = start
+    if searched is not None and sig.ext in searched:
+        known_lo, known_hi = searched[sig.ext]
+        if known_lo <= start <= known_hi:
+            search_from, lo = known_hi, known_lo
+    end = data.find(sig.footer, search_from, limit) if search_from < limit else -1
+    if searched is not None:
+        searched[sig.ext] = (lo, max(search_from, limit - len(sig.footer) + 1) if end == -1 else end)
+
+    if end == -1:
+        return None
+    if sig.after_footer is not None:
+        return sig.after_footer(data, end, limit)
+    return end + len(sig.footer)
+
+def _scan_batches(data, signatures, start=0, stop=None, next_offsets=None, window=SCAN_WINDOW):
+    """
+    Scans data once for all signatures, yielding (window_stop, hits) for each
+    window of [start, stop), where hits lists (signature, start, end) for
+    every carvable file whose header lies in that window, in offset order.
+    Headers inside a file already carved for the same type are skipped;
+    next_offsets holds that state per extension and is updated in place.
+    Footer-less ranges already searched are remembered per extension for
+    the rest of the scan (see _find_extent).
+
+    The image is walked window by window; every header is searched within
+    the current window while it is hot in cache, so the image itself is only
+    traversed once however many signatures are registered. Windows overlap
+    by the longest header so matches straddling a boundary are still found.
+    """
+    headers = [(header, sig) for sig in signatures for header in sig.headers]
+    overlap = max(len(header) for header, _ in headers) - 1
+    if next_offsets is None:
+        next_offsets = {sig.ext: 0 for sig in signatures}
+    searched = {}
+    size = len(data)
+    stop = size if stop is None else min(stop, size)
+
+    for window_start in range(start, stop, window):
+        window_stop = min(window_start + window, stop)
+        search_stop = min(window_stop + overlap, size)
+
+        candidates = []
+        for header, sig in headers:
+            pos = data.find(header, window_start, search_stop)
+            while pos != -1 and pos < window_stop:
+                candidates.append((pos, sig))
+                pos = data.find(header, pos + 1, search_stop)
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        hits = []
+        for hit_start, sig in candidates:
+            if hit_start < next_offsets[sig.ext]:
+                continue
+
+            end = _find_extent(sig, data, hit_start, searched)
+            if end is None:
+                continue
+
+            next_offsets[sig.ext] = end
+            hits.append((sig, hit_start, end))
+        yield window_stop, hits
+
+def _scan(data, signatures, start=0, stop=None, next_offsets=None, window=SCAN_WINDOW):
+    """Like _scan_batches, but yields the (signature, start, end) hits one by one."""
+    for _, hits in _scan_batches(data, signatures, start, stop, next_offsets, window):
+        yield from hits
+
+def _scan_segment(binary_path, signatures, start, stop):
+    """
+    Worker entry point for parallel mode: scans one byte range of the image
+    with a fresh skip state. Returns the hits as (ext, start, end) tuples and
+    the CPU time spent scanning.
+    """
+    began = time.process_time()
+    with open(binary_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            hits = [(sig.ext, hit_start, end) for sig, hit_start, end in _scan(data, signatures, start, stop)]
+    return hits, time.process_time() - began
+
+def _reconcile(data, sig, worker_hits, carried_end, seg_stop):
+    """
+    Corrects a worker's (ext, start, end) hits for one type when a file
+    carved in an earlier segment ends at carried_end inside this segment.
+
+    Worker hits starting before the carried end are dropped. Only the range
+    their skip state covered past the carried end (at most max_size bytes)
+    is rescanned here with the sequential skip state; once that state
+    catches up with the worker's, both scans find the same hits, so the
+    remaining worker hits are kept.
+    """
+    state = carried_end
+    hits = []
+    i = 0
+    while True:
+        worker_end = None
+        while i < len(worker_hits) and worker_hits[i][1] < state:
+            worker_end = worker_hits[i][2]
+            i += 1
+        if worker_end is None or worker_end <= state:
+            break
+        offsets = {sig.ext: state}
+        hits += [(sig.ext, hit_start, end) for _, hit_start, end
+                 in _scan(data, [sig], state, min(worker_end, seg_stop), offsets)]
+        if offsets[sig.ext] == state:
+            # Nothing carvable in the gap: the worker's skip state was ahead
+            state = worker_end
+        else:
+            state = offsets[sig.ext]
+    return hits + worker_hits[i:]
+
+def _scan_parallel(binary_path, data, signatures, workers, segment_size, start=0, next_offsets=None):
+    """
+    Scans the image from start in segment_size byte ranges on a process
+    pool, yielding (segment_stop, hits) batches with the same hits and skip
+    state as _scan_batches.
+
+    Each worker only reports headers that start inside its own range, so
+    seams never produce duplicates. A worker cannot know whether a file
+    carved in an earlier segment runs into its range; when one does, the
+    affected types are rescanned here with the carried skip state so the
+    result matches a sequential scan exactly.
+    """
+    by_ext = {sig.ext: sig for sig in signatures}
+    if next_offsets is None:
+        next_offsets = {sig.ext: 0 for sig in signatures}
+    segments = deque((seg_start, min(seg_start + segment_size, len(data)))
+                     for seg_start in range(start, len(data), segment_size))
+    segment_count = len(segments)
+    pending = deque()
+    busy = 0.0
+    began = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while segments or pending:
+            # Keep a bounded number of segments in flight
+            while segments and len(pending) < workers * 2:
+                seg_start, seg_stop = segments.popleft()
+                future = pool.submit(_scan_segment, binary_path, signatures, seg_start, seg_stop)
+                pending.append((seg_start, seg_stop, future))
+
+            seg_start, seg_stop, future = pending.popleft()
+            results, elapsed = future.result()
+            busy += elapsed
+
+            carried = [ext for ext, offset in next_offsets.items() if offset > seg_start]
+            if carried:
+                carried_results = [hit for hit in results if hit[0] in carried]
+                results = [hit for hit in results if hit[0] not in carried]
+                for ext in carried:
+                    worker_hits = [hit for hit in carried_results if hit[0] == ext]
+                    results += _reconcile(data, by_ext[ext], worker_hits, next_offsets[ext], seg_stop)
+                results.sort(key=lambda hit: hit[1])
+
+            hits = []
+            for ext, hit_start, end in results:
+                next_offsets[ext] = end
+                hits.append((by_ext[ext], hit_start, end))
+            yield seg_stop, hits
+
+    elapsed = time.perf_counter() - began
+    logger.info(f"Parallel carve: {segment_count} segments on {workers} workers in {elapsed:.2f}s "
+                f"(scan CPU time {busy:.2f}s, speedup {busy / elapsed if elapsed else 0:.1f}x)")
+
+class _CarveOutput:
+    """
+    Stores carved payloads according to the carve mode and keeps the
+    per-type counts: numbered files by default, manifest records only in
+    index-only mode, or content-addressed objects plus a manifest in
+    dedupe mode.
+    """
+
+    def __init__(self, output_dir, extensions, index_only=False, dedupe=False, resume=None):
+        self.output_dir = output_dir
+        self.dedupe = dedupe and not index_only
+        self.counts = {ext: 0 for ext in extensions}
+        self.stored_objects = set()
+        self.duplicate_bytes = 0
+        self.manifest = None
+
+        if resume is not None:
+            self.counts.update(resume['counts'])
+        if index_only or dedupe:
+            if resume is not None:
+                # Drop records written after the checkpoint; they will be emitted again
+                self.manifest = open(os.path.join(output_dir, MANIFEST_NAME), 'a')
+                self.manifest.truncate(resume['manifest_size'])
+            else:
+                self.manifest = open(os.path.join(output_dir, MANIFEST_NAME), 'w')
+
+    def emit(self, sig, start, payload):
+        """Stores one carved payload found at offset start."""
+        if self.manifest is None:
+            filename = os.path.join(self.output_dir, f"recovered_{self.counts[sig.ext]}.{sig.ext}")
+            with open(filename, 'wb') as out:
+                out.write(payload)
+        else:
+            digest = hashlib.sha256(payload).hexdigest()
+            record = {'type': sig.ext, 'offset': start, 'length': len(payload), 'sha256': digest}
+            if self.dedupe:
+                record['path'] = f"{OBJECTS_DIR}/{digest[:2]}/{digest}.{sig.ext}"
+                self._store_object(record['path'], payload)
+            self.manifest.write(json.dumps(record) + '\n')
+        self.counts[sig.ext] += 1
+
+    def _store_object(self, path, payload):
+        """Writes a content-addressed payload unless it is already stored."""
+        if path in self.stored_objects:
+            self.duplicate_bytes += len(payload)
+            return
+        self.stored_objects.add(path)
+
+        filename = os.path.join(self.output_dir, *path.split('/'))
+        if os.path.exists(filename):
+            return
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as out:
+            out.write(payload)
+
+    def sync(self):
+        """Flushes the manifest to disk and returns its size."""
+        if self.manifest is None:
+            return 0
+        self.manifest.flush()
+        os.fsync(self.manifest.fileno())
+        return self.manifest.tell()
+
+    def close(self):
+        if self.dedupe:
+            logger.info(f"Deduplicated carve: {len(self.stored_objects)} unique objects, "
+                        f"{self.duplicate_bytes} duplicate bytes not written")
+        if self.manifest is not None:
+            self.manifest.close()
+
+def _checkpoint_key(binary_path, signatures, index_only, dedupe):
+    """Identifies the inputs a checkpoint is valid for."""
+    st = os.stat(binary_path)
+    return {
+        'source': os.path.abspath(binary_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'types': [sig.ext for sig in signatures],
+        'index_only': index_only,
+        'dedupe': dedupe
+    }
+
+def _load_checkpoint(path, key):
+    """Returns the saved carve state if it matches key, otherwise None."""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable carve checkpoint {path}: {e}")
+        return None
+    if state.get('key') != key:
+        logger.warning(f"Ignoring carve checkpoint {path}: it was written for different inputs")
+        return None
+    return state
+
+def _save_checkpoint(path, state):
+    """Atomically replaces the checkpoint file with state."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def carve_files(binary_path, output_dir, types=None, workers=1, segment_size=SEGMENT_SIZE,
+                index_only=False, dedupe=False, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Carves files of every registered type from a binary file.
+
+    The image is memory-mapped rather than read into memory, so peak memory
+    stays bounded regardless of the image size. All signatures are matched
+    in a single pass, so adding types does not add passes over the image.
+    JPEG and PNG extents come from their marker/chunk structure rather than
+    the first footer, so truncated or bogus candidates are not written.
+
+    With workers > 1, images larger than segment_size are split into byte
+    ranges that are scanned on a process pool. Output names and counts are
+    identical to a sequential run.
+
+    With index_only, no payloads are written. Instead each hit is recorded as
+    a JSON line {'type', 'offset', 'length', 'sha256'} in MANIFEST_NAME in the
+    output directory; extract_carved() recovers selected entries later.
+
+    With dedupe, each payload is stored once under its SHA256 as
+    objects/<first two hex digits>/<sha256>.<ext>, and the manifest maps
+    every hit to its hash and object path.
+
+    Every checkpoint_interval bytes the scan offset, counts, skip state for
+    files that run past the offset and manifest length are saved to
+    CHECKPOINT_NAME in the output directory. Rerunning with the same inputs
+    resumes from there without emitting already-written files again; the
+    checkpoint is removed once the carve completes.
 
     Args:
         binary_path (str): Path to the binary file (e.g., disk image or raw dump).
         output_dir (str): Directory to save recovered files.
+        types (list): Extensions to carve (default: all registered signatures).
+        workers (int): Number of worker processes (None: one per CPU core).
+        segment_size (int): Bytes per segment in parallel mode.
+        index_only (bool): Record hits in a manifest instead of writing files.
+        dedupe (bool): Store identical payloads only once, in a content-addressed layout.
+        checkpoint_interval (int): Bytes scanned between checkpoints (None disables them).
 
     Returns:
-        dict: Counts of recovered files {'jpg': count, 'png': count}.
+        dict: Counts of recovered (or indexed) files per type, e.g. {'jpg': count, 'png': count, ...}.
     """
     if not os.path.isfile(binary_path):
         logger.error(f"File not found: {binary_path}")
         return None
 
+    try:
+        signatures = [SIGNATURES[ext] for ext in (types or SIGNATURES)]
+    except KeyError as e:
+        logger.error(f"Unknown carving type: {e}")
+        return None
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # Signatures
-    JPG_START = b'\xFF\xD8\xFF'
-    JPG_END = b'\xFF\xD9'
-    PNG_START = b'\x89PNG\r\n\x1a\n'
-    PNG_END = b'IEND\xae\x42\x60\x82'
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_NAME)
+    output = None
+    try:
+        key = _checkpoint_key(binary_path, signatures, index_only, dedupe)
+        state = _load_checkpoint(checkpoint_path, key) if checkpoint_interval else None
+        if state is not None and (index_only or dedupe):
+            # The checkpoint only holds if every record it counted is still in the manifest
+            manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+            if not os.path.isfile(manifest_path) or os.path.getsize(manifest_path) < state['manifest_size']:
+                logger.warning(f"Ignoring carve checkpoint {checkpoint_path}: {manifest_path} is missing or truncated")
+                state = None
+        output = _CarveOutput(output_dir, [sig.ext for sig in signatures], index_only, dedupe, state)
+
+        start = 0
+        next_offsets = {sig.ext: 0 for sig in signatures}
+        if state is not None:
+            start = state['offset']
+            next_offsets.update(state['next_offsets'])
+            logger.info(f"Resuming carve of {binary_path} from offset {start}")
+
+        with open(binary_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                logger.info(f"Carving complete. Recovered: {output.counts}")
+                return output.counts
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+
+                if workers > 1 and size - start > segment_size:
+                    batches = _scan_parallel(binary_path, data, signatures, workers, segment_size, start, next_offsets)
+                else:
+                    batches = _scan_batches(data, signatures, start, None, next_offsets)
 
-    recovered_counts = {'jpg': 0, 'png': 0}
+                # Write straight from the mapping without copying each payload
+                last_checkpoint = start
+                with memoryview(data) as view:
+                    for scanned, hits in batches:
+                        for sig, hit_start, end in hits:
+                            with view[hit_start:end] as payload:
+                                output.emit(sig, hit_start, payload)
+
+                        if checkpoint_interval and scanned - last_checkpoint >= checkpoint_interval and scanned < size:
+                            _save_checkpoint(checkpoint_path, {
+                                'key': key,
+                                'offset': scanned,
+                                'next_offsets': next_offsets,
+                                'counts': output.counts,
+                                'manifest_size': output.sync()
+                            })
+                            last_checkpoint = scanned
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        logger.info(f"Carving complete. Recovered: {output.counts}")
+        return output.counts
+
+    except Exception as e:
+        logger.error(f"Error carving files from {binary_path}: {e}")
+        return None
+    finally:
+        if output is not None:
+            output.close()
+
+def read_manifest(manifest_path):
+    """
+    Iterates over the records of a carving manifest.
+
+    Args:
+        manifest_path (str): Path to a manifest written by carve_files.
+
+    Yields:
+        dict: One record per carved hit.
+    """
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def extract_carved(binary_path, manifest_path, output_dir, offsets=None, types=None):
+    """
+    Extracts entries recorded by an index-only carve, seeking directly to
+    each entry's offset in the image. Extracted payloads are checked against
+    the SHA256 recorded in the manifest.
+
+    Args:
+        binary_path (str): Path to the image the manifest was built from.
+        manifest_path (str): Path to the manifest.
+        output_dir (str): Directory to save extracted files.
+        offsets (iterable): Only extract entries at these offsets (default: all).
+        types (iterable): Only extract entries of these types (default: all).
+
+    Returns:
+        int: Number of files extracted, or None if an error occurs.
+    """
+    if not os.path.isfile(binary_path):
+        logger.error(f"File not found: {binary_path}")
+        return None
+    if not os.path.isfile(manifest_path):
+        logger.error(f"Manifest not found: {manifest_path}")
+        return None
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    offsets = set(offsets) if offsets is not None else None
+    types = set(types) if types is not None else None
+    extracted = 0
 
     try:
         with open(binary_path, 'rb') as f:
-            data = f.read()
-
-        # Carve JPGs
-        offset = 0
-        while True:
-            start = data.find(JPG_START, offset)
-            if start == -1:
-                break
-            
-            end = data.find(JPG_END, start)
-            if end == -1:
-                break
-            
-            # Include end marker
-            end += 2
-            
-            file_data = data[start:end]
-            # Basic validation: max size 10MB
-            if len(file_data) < 10 * 1024 * 1024:
-                filename = os.path.join(output_dir, f"recovered_{recovered_counts['jpg']}.jpg")
-                with open(filename, 'wb') as out:
-                    out.write(file_data)
-                recovered_counts['jpg'] += 1
-            
-            offset = end
-
-        # Carve PNGs
-        offset = 0
-        while True:
-            start = data.find(PNG_START, offset)
-            if start == -1:
-                break
-            
-            end = data.find(PNG_END, start)
-            if end == -1:
-                break
-            
-            # Include end marker
-            end += 8
-            
-            file_data = data[start:end]
-            if len(file_data) < 10 * 1024 * 1024:
-                filename = os.path.join(output_dir, f"recovered_{recovered_counts['png']}.png")
+            for record in read_manifest(manifest_path):
+                if offsets is not None and record['offset'] not in offsets:
+                    continue
+                if types is not None and record['type'] not in types:
+                    continue
+
+                filename = os.path.join(output_dir, f"offset_{record['offset']}.{record['type']}")
+                digest = hashlib.sha256()
+                f.seek(record['offset'])
+                remaining = record['length']
                 with open(filename, 'wb') as out:
-                    out.write(file_data)
-                recovered_counts['png'] += 1
-            
-            offset = end
+                    while remaining:
+                        chunk = f.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        out.write(chunk)
+                        remaining -= len(chunk)
+
+                if digest.hexdigest() != record['sha256']:
+                    logger.warning(f"SHA256 mismatch for {record['type']} at offset {record['offset']}; "
+                                   f"image differs from manifest, discarding {filename}")
+                    os.remove(filename)
+                    continue
+                extracted += 1
 
-        logger.info(f"Carving complete. Recovered: {recovered_counts}")
-        return recovered_counts
+        logger.info(f"Extracted {extracted} files from {binary_path}")
+        return extracted
 
     except Exception as e:
-        logger.error(f"Error carving files from {binary_path}: {e}")
+        logger.error(f"Error extracting carved files from {binary_path}: {e}")
         return None
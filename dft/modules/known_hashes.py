@@ -0,0 +1,240 @@
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+import numpy as np
+from dft.utils.logger import logger
+
+# Index file layout:
+#   header (HEADER_SIZE bytes): magic, algorithm, digest size, Bloom filter
+#       hash count, record count, Bloom filter size in bytes
+#   Bloom filter bit array (may be empty)
+#   sorted, de-duplicated raw digests of digest size bytes each
+MAGIC = b'DFTKHI01'
+HEADER = struct.Struct('<8s16sHH4xQQ')
+HEADER_SIZE = 64
+
+# Bloom filter sizing: ~1% false positives at 10 bits per entry with 7 hashes
+DEFAULT_BLOOM_BITS = 10
+BLOOM_HASHES = 7
+
+# Digests sorted in memory at once while building; larger sets are merged from sorted runs
+SORT_CHUNK = 5000000
+
+_MASK64 = (1 << 64) - 1
+
+def _bloom_positions(h1, h2, bloom_bits):
+    """
+    Bloom filter bit positions by double hashing. Digests are already
+    uniformly distributed, so their first 16 bytes serve as the two hashes.
+    """
+    return [((h1 + i * h2) & _MASK64) % bloom_bits for i in range(BLOOM_HASHES)]
+
+def _set_bloom_bits(bloom, records, bloom_bits):
+    """Sets the Bloom filter bits for an (n, digest size) uint8 array of digests."""
+    h1 = records[:, 0:8].copy().view('<u8').ravel()
+    h2 = records[:, 8:16].copy().view('<u8').ravel() | np.uint64(1)
+    with np.errstate(over='ignore'):
+        for i in range(BLOOM_HASHES):
+            positions = (h1 + np.uint64(i) * h2) % np.uint64(bloom_bits)
+            np.bitwise_or.at(bloom, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+def _iter_list_digests(list_path, digest_size):
+    """
+    Yields raw digests from a hash list: one entry per line, taking the first
+    hex token of the right length, which covers plain lists as well as
+    NSRL-style CSV files.
+    """
+    pattern = re.compile(rf'(?<![0-9A-Fa-f])[0-9A-Fa-f]{{{digest_size * 2}}}(?![0-9A-Fa-f])')
+    with open(list_path, 'r', errors='replace') as f:
+        for line in f:
+            match = pattern.search(line)
+            if match:
+                yield bytes.fromhex(match.group())
+
+def _sorted_runs(sources, digest_size, tmp_dir, chunk):
+    """
+    Reads all digests and sorts them in chunks. Returns the single sorted
+    array if everything fit in one chunk, otherwise a list of run files.
+    """
+    runs = []
+    buffer = []
+
+    def flush():
+        records = np.unique(np.array(buffer, dtype=f'S{digest_size}'))
+        buffer.clear()
+        return records
+
+    for list_path in sources:
+        for digest in _iter_list_digests(list_path, digest_size):
+            buffer.append(digest)
+            if len(buffer) >= chunk:
+                run_path = os.path.join(tmp_dir, f"run_{len(runs)}.bin")
+                flush().tofile(run_path)
+                runs.append(run_path)
+
+    if not runs:
+        return flush()
+    if buffer:
+        run_path = os.path.join(tmp_dir, f"run_{len(runs)}.bin")
+        flush().tofile(run_path)
+        runs.append(run_path)
+    return runs
+
+def _read_run(run_path, digest_size):
+    with open(run_path, 'rb') as f:
+        while record := f.read(digest_size):
+            yield record
+
+def _dedupe_batches(merged, digest_size, batch_size=1000000):
+    """Groups a merged stream of sorted digests into de-duplicated arrays."""
+    batch = []
+    last = None
+    for record in merged:
+        if record == last:
+            continue
+        last = record
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield np.array(batch, dtype=f'S{digest_size}')
+            batch = []
+    if batch:
+        yield np.array(batch, dtype=f'S{digest_size}')
+
+def build_known_index(sources, output_path, algorithm='sha1', bloom_bits_per_entry=DEFAULT_BLOOM_BITS, chunk=SORT_CHUNK):
+    """
+    Builds a known-hash index from hash lists (e.g. NSRL exports).
+
+    Args:
+        sources (str or list): Hash list file(s), one digest per line.
+        output_path (str): Path of the index to write.
+        algorithm (str): hashlib name of the digests in the lists.
+        bloom_bits_per_entry (int): Bloom filter size; 0 disables the filter.
+        chunk (int): Digests sorted in memory at once.
+
+    Returns:
+        int: Number of unique digests indexed, or None if an error occurs.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+
+    for list_path in sources:
+        if not os.path.isfile(list_path):
+            logger.error(f"File not found: {list_path}")
+            return None
+
+    try:
+        digest_size = hashlib.new(algorithm).digest_size
+        if digest_size < 16:
+            raise ValueError(f"digest of {algorithm} is too short to index")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sorted_data = _sorted_runs(sources, digest_size, tmp_dir, chunk)
+
+            if isinstance(sorted_data, list):
+                merged = heapq.merge(*(_read_run(run, digest_size) for run in sorted_data))
+                total = sum(os.path.getsize(run) for run in sorted_data) // digest_size
+            else:
+                merged = None
+                total = len(sorted_data)
+
+            bloom_bits = (total * bloom_bits_per_entry + 7) // 8 * 8
+            bloom = np.zeros(bloom_bits // 8, dtype=np.uint8)
+
+            batches = [sorted_data] if merged is None else _dedupe_batches(merged, digest_size)
+            with open(output_path, 'wb') as out:
+                out.seek(HEADER_SIZE + len(bloom))
+                count = 0
+                for batch in batches:
+                    out.write(batch.tobytes())
+                    if bloom_bits:
+                        _set_bloom_bits(bloom, batch.view(np.uint8).reshape(-1, digest_size), bloom_bits)
+                    count += len(batch)
+
+                out.seek(0)
+                header = HEADER.pack(MAGIC, algorithm.encode('ascii'), digest_size, BLOOM_HASHES if bloom_bits else 0,
+                                     count, len(bloom))
+                out.write(header.ljust(HEADER_SIZE, b'\x00'))
+                out.write(bloom.tobytes())
+
+        logger.info(f"Known-hash index written to {output_path}: {count} {algorithm} digests")
+        return count
+
+    except Exception as e:
+        logger.error(f"Error building known-hash index {output_path}: {e}")
+        return None
+
+class _Records:
+    """Sequence view over the sorted digests of an index, for bisect."""
+
+    def __init__(self, data, offset, digest_size, count):
+        self.data = data
+        self.offset = offset
+        self.digest_size = digest_size
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.digest_size
+        return self.data[start:start + self.digest_size]
+
+class KnownHashIndex:
+    """
+    A memory-mapped known-hash index written by build_known_index. Lookups
+    check the Bloom filter (if any) and then binary-search the sorted
+    digests, so opening and querying take milliseconds regardless of size.
+    """
+
+    def __init__(self, index_path):
+        self._file = open(index_path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, algorithm, digest_size, bloom_hashes, count, bloom_size = HEADER.unpack_from(self._data, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{index_path} is not a known-hash index")
+        except Exception:
+            self._file.close()
+            raise
+
+        self.algorithm = algorithm.rstrip(b'\x00').decode('ascii')
+        self.digest_size = digest_size
+        self._bloom_offset = HEADER_SIZE
+        self._bloom_bits = bloom_size * 8 if bloom_hashes else 0
+        self._records = _Records(self._data, HEADER_SIZE + bloom_size, digest_size, count)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, digest):
+        if isinstance(digest, str):
+            digest = bytes.fromhex(digest)
+        if len(digest) != self.digest_size:
+            return False
+
+        if self._bloom_bits:
+            h1 = int.from_bytes(digest[0:8], 'little')
+            h2 = int.from_bytes(digest[8:16], 'little') | 1
+            for pos in _bloom_positions(h1, h2, self._bloom_bits):
+                if not self._data[self._bloom_offset + (pos >> 3)] & (1 << (pos & 7)):
+                    return False
+
+        records = self._records
+        i = bisect.bisect_left(records, digest)
+        return i < len(records) and records[i] == digest
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
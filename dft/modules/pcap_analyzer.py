@@ -1,15 +1,770 @@
-from scapy.all import rdpcap, IP, TCP, UDP
-from collections import Counter
+from scapy.all import PcapReader, IP, IPv6, TCP, UDP, conf
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import json
+import mmap
 import os
+import re
+import socket
+import struct
+from dft.utils.exporter import export_table, CHUNK_ROWS
+from dft.utils.files import iter_files
 from dft.utils.logger import logger
+import numpy as np
 import pandas as pd
 
-def analyze_pcap(pcap_path):
+# Capture file names picked up from directories, including rotated
+# tcpdump -C/-W files (capture.pcap1, capture.pcap2, ...)
+_CAPTURE_NAME = re.compile(r'\.(pcap|pcapng|cap)\d*$', re.IGNORECASE)
+
+# Seconds without packets after which a flow is considered finished
+FLOW_IDLE_TIMEOUT = 120
+
+# Sidecar time index: file suffix and bytes of capture per index entry
+TIME_INDEX_SUFFIX = '.tidx'
+TIME_INDEX_BLOCK = 1024 * 1024
+
+# Classic pcap magic numbers: (byte order, timestamp fraction units)
+_PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+_PCAPNG_SHB = b'\x0a\x0d\x0d\x0a'
+
+# Link types the raw parser understands
+_LINKTYPE_NULL = 0
+_LINKTYPE_ETHERNET = 1
+_LINKTYPE_RAW = (12, 14, 101)
+_LINKTYPE_IPV4 = 228
+_LINKTYPE_IPV6 = 229
+_LINKTYPE_LINUX_SLL = 113
+_LINKTYPE_LINUX_SLL2 = 276
+
+_VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+_IPV6_EXTENSION_HEADERS = (0, 43, 44, 60)
+
+# Returned by _parse_frame for link types it cannot decode
+_UNSUPPORTED = object()
+
+# Transport protocol codes of the packet table's l4 column
+_L4_NAMES = (None, 'TCP', 'UDP')
+_L4_CODES = {name: code for code, name in enumerate(_L4_NAMES)}
+
+_TCP_FLAG_LETTERS = 'FSRPAUECN'
+
+class PacketTable:
+    """
+    Per-packet records stored column-wise in growable typed arrays. Addresses
+    are interned: src and dst hold int32 codes into addresses (-1 if the
+    packet has no IP layer), proto/sport/dport are only meaningful where
+    src >= 0 and l4 != 0 respectively.
+    """
+
+    COLUMNS = ('time', 'src', 'dst', 'proto', 'sport', 'dport', 'l4')
+
+    def __init__(self):
+        self.time = array('d')
+        self.src = array('i')
+        self.dst = array('i')
+        self.proto = array('B')
+        self.sport = array('H')
+        self.dport = array('H')
+        self.l4 = array('B')
+        self.addresses = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.time)
+
+    def address_code(self, address):
+        """Returns the code of address, interning it on first use."""
+        if address is None:
+            return -1
+        code = self._codes.get(address)
+        if code is None:
+            code = self._codes[address] = len(self.addresses)
+            self.addresses.append(address)
+        return code
+
+    def append(self, time, src, dst, proto, sport, dport, l4):
+        self.time.append(time)
+        self.src.append(self.address_code(src))
+        self.dst.append(self.address_code(dst))
+        self.proto.append(proto or 0)
+        self.sport.append(sport or 0)
+        self.dport.append(dport or 0)
+        self.l4.append(_L4_CODES[l4])
+
+    def columns(self):
+        """
+        Returns the columns as NumPy arrays sharing memory with the table.
+        The table cannot grow while these views are alive.
+        """
+        return {name: np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+                for name in self.COLUMNS}
+
+    def counts(self):
+        """
+        Computes the summary Counters from the columns.
+
+        Returns:
+            tuple: (src_ips, dst_ips, top_ports, protocols) Counters.
+        """
+        cols = self.columns()
+        n_addresses = len(self.addresses)
+        has_l4 = cols['l4'] > 0
+
+        def counter(values, names=None, minlength=0):
+            counts = np.bincount(values, minlength=minlength)
+            keys = np.flatnonzero(counts)
+            labels = [names[k] for k in keys] if names is not None else keys.tolist()
+            return Counter(dict(zip(labels, counts[keys].tolist())))
+
+        src = cols['src']
+        return (counter(src[src >= 0], self.addresses, n_addresses),
+                counter(cols['dst'][cols['dst'] >= 0], self.addresses, n_addresses),
+                counter(cols['dport'][has_l4]),
+                counter(cols['l4'][has_l4], _L4_NAMES))
+
+    @classmethod
+    def merge(cls, tables):
+        """
+        Combines tables into a new one sorted by time, remapping each table's
+        address codes onto a shared address list.
+        """
+        merged = cls()
+        parts = {name: [] for name in cls.COLUMNS}
+        for table in tables:
+            cols = table.columns()
+            # Index -1 (no address) maps to the trailing -1
+            remap = np.array([merged.address_code(a) for a in table.addresses] + [-1], dtype=np.int32)
+            for name in cls.COLUMNS:
+                parts[name].append(remap[cols[name]] if name in ('src', 'dst') else cols[name])
+
+        if not parts['time']:
+            return merged
+        order = np.argsort(np.concatenate(parts['time']), kind='stable')
+        for name in cls.COLUMNS:
+            column = getattr(merged, name)
+            column.frombytes(np.concatenate(parts[name]).astype(column.typecode, copy=False)[order].tobytes())
+        return merged
+
+    def to_dataframe(self, start=None, stop=None):
+        """
+        Returns the packets (or rows start:stop) as a DataFrame. Numeric
+        columns share memory with the table; addresses become categoricals
+        over the interned list and missing values are nullable (proto/ports
+        of non-IP/non-TCP/UDP packets).
+        """
+        cols = {name: column[start:stop] for name, column in self.columns().items()}
+        categories = pd.Index(self.addresses, dtype=object)
+        no_ip = cols['src'] < 0
+        no_l4 = cols['l4'] == 0
+        return pd.DataFrame({
+            'time': cols['time'],
+            'src': pd.Categorical.from_codes(cols['src'], categories=categories),
+            'dst': pd.Categorical.from_codes(cols['dst'], categories=categories),
+            'proto': pd.arrays.IntegerArray(cols['proto'], no_ip),
+            'sport': pd.arrays.IntegerArray(cols['sport'], no_l4),
+            'dport': pd.arrays.IntegerArray(cols['dport'], no_l4),
+        }, copy=False)
+
+class FlowTable:
+    """
+    Incremental bidirectional flow statistics keyed by normalized 5-tuple.
+    The first packet of a flow fixes its orientation: its sender is 'src',
+    and later packets in either direction are counted as forward or reverse.
+
+    Flows idle for longer than idle_timeout (in capture time) are expired:
+    handed to on_expire(flow dict) if given, otherwise kept as finished rows
+    for to_dataframe(). Active flows are kept in last-seen order, so eviction
+    only ever looks at the oldest ones.
+
+    Expiry bounds the active flows, not the table: without on_expire every
+    flow of the capture is kept as a finished row. Callers that need bounded
+    memory on long captures must stream flows out through on_expire.
+    """
+
+    COLUMNS = ('proto', 'src', 'sport', 'dst', 'dport', 'first_seen', 'last_seen',
+               'packets_fwd', 'bytes_fwd', 'packets_rev', 'bytes_rev', 'tcp_flags')
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, on_expire=None):
+        self.idle_timeout = idle_timeout
+        self.on_expire = on_expire
+        self.active = OrderedDict()
+        self.finished = []
+        self._next_eviction = float('inf')
+
+    def __len__(self):
+        return len(self.active) + len(self.finished)
+
+    def add(self, time, src, dst, proto, sport, dport, length, flags):
+        if time >= self._next_eviction:
+            self.expire_idle(time)
+
+        active = self.active
+        key = (proto, src, sport, dst, dport)
+        flow = active.get(key)
+        forward = True
+        if flow is None:
+            reverse = (proto, dst, dport, src, sport)
+            flow = active.get(reverse)
+            if flow is not None:
+                key, forward = reverse, False
+            else:
+                # first_seen, last_seen, packets/bytes forward, packets/bytes reverse, flags
+                flow = active[key] = [time, time, 0, 0, 0, 0, 0]
+                self._next_eviction = min(self._next_eviction, time + self.idle_timeout)
+
+        flow[1] = time
+        if forward:
+            flow[2] += 1
+            flow[3] += length
+        else:
+            flow[4] += 1
+            flow[5] += length
+        flow[6] |= flags
+        active.move_to_end(key)
+
+    @classmethod
+    def merge(cls, tables, idle_timeout=FLOW_IDLE_TIMEOUT):
+        """
+        Combines flow tables, e.g. of consecutive rotated capture files. Rows
+        are replayed in first-seen order, so a flow that continues across
+        files within idle_timeout becomes a single flow again, and one that
+        resumes after a longer gap stays separate.
+        """
+        merged = cls(idle_timeout)
+        rows = sorted((row for table in tables for row in table.rows()), key=lambda row: row[5])
+        for row in rows:
+            merged._merge_row(row)
+        return merged
+
+    def _merge_row(self, row):
+        proto, src, sport, dst, dport, first, last, packets_fwd, bytes_fwd, packets_rev, bytes_rev, flags = row
+        if first >= self._next_eviction:
+            self.expire_idle(first)
+
+        active = self.active
+        key = (proto, src, sport, dst, dport)
+        reverse = (proto, dst, dport, src, sport)
+        flow = active.get(key)
+        if flow is None:
+            flow = active.get(reverse)
+            if flow is not None:
+                key = reverse
+                packets_fwd, bytes_fwd, packets_rev, bytes_rev = packets_rev, bytes_rev, packets_fwd, bytes_fwd
+
+        # Replayed rows are in first-seen rather than last-seen order, so a
+        # long flow at the front can stop expire_idle short of flows that have
+        # already gone idle; check the gap to the matching flow directly
+        if flow is not None and first - flow[1] > self.idle_timeout:
+            del active[key]
+            self._expire(key, flow)
+            flow = None
+            if key == reverse:
+                key = (proto, src, sport, dst, dport)
+                packets_fwd, bytes_fwd, packets_rev, bytes_rev = packets_rev, bytes_rev, packets_fwd, bytes_fwd
+
+        if flow is None:
+            flow = active[key] = [first, last, 0, 0, 0, 0, 0]
+            self._next_eviction = min(self._next_eviction, last + self.idle_timeout)
+
+        flow[0] = min(flow[0], first)
+        flow[1] = max(flow[1], last)
+        flow[2] += packets_fwd
+        flow[3] += bytes_fwd
+        flow[4] += packets_rev
+        flow[5] += bytes_rev
+        flow[6] |= flags
+        active.move_to_end(key)
+
+    def expire_idle(self, now):
+        """Expires flows whose last packet is older than now - idle_timeout."""
+        active = self.active
+        limit = now - self.idle_timeout
+        while active:
+            key, flow = next(iter(active.items()))
+            if flow[1] >= limit:
+                self._next_eviction = flow[1] + self.idle_timeout
+                return
+            del active[key]
+            self._expire(key, flow)
+        self._next_eviction = float('inf')
+
+    def expire_all(self):
+        """Expires every active flow, e.g. at the end of a capture."""
+        while self.active:
+            self._expire(*self.active.popitem(last=False))
+        self._next_eviction = float('inf')
+
+    def _expire(self, key, flow):
+        row = key + tuple(flow)
+        if self.on_expire is not None:
+            self.on_expire(self._flow_dict(row))
+        else:
+            self.finished.append(row)
+
+    def rows(self):
+        """Returns finished and active flows as tuples in COLUMNS order, by first seen."""
+        rows = self.finished + [key + tuple(flow) for key, flow in self.active.items()]
+        return sorted(rows, key=lambda row: row[5])
+
+    def _flow_dict(self, row):
+        flow = dict(zip(self.COLUMNS, row))
+        flow['tcp_flags'] = _tcp_flag_string(flow['tcp_flags'])
+        return flow
+
+    def to_dataframe(self):
+        """Returns one row per flow, with a duration column and TCP flags as letters."""
+        df = pd.DataFrame(self.rows(), columns=list(self.COLUMNS))
+        df.insert(7, 'duration', df['last_seen'] - df['first_seen'])
+        df['tcp_flags'] = [_tcp_flag_string(flags) for flags in df['tcp_flags']]
+        for column in ('sport', 'dport'):
+            df[column] = df[column].astype('UInt16')
+        return df
+
+def _tcp_flag_string(flags):
+    """Renders OR'd TCP flags scapy-style, e.g. 0x12 -> 'SA'."""
+    return ''.join(letter for bit, letter in enumerate(_TCP_FLAG_LETTERS) if flags & (1 << bit))
+
+class _StatsBuilder:
+    """
+    Accumulates summary statistics one packet at a time, so a capture never
+    has to be held in memory as a whole. With include_packets the packets go
+    to a PacketTable and the Counters are computed from it at the end; IP
+    packets are also aggregated into flows unless flows is None.
+    """
+
+    def __init__(self, include_packets=True, flows=None):
+        self.include_packets = include_packets
+        self.packets = PacketTable()
+        self.flows = flows
+        self.stats = {
+            'packet_count': 0,
+            'src_ips': Counter(),
+            'dst_ips': Counter(),
+            'top_ports': Counter(),
+            'protocols': Counter(),
+        }
+
+    def add(self, time, src, dst, proto, sport, dport, l4, length=0, flags=0):
+        if self.flows is not None and src is not None:
+            self.flows.add(time, src, dst, proto, sport, dport, length, flags)
+
+        if self.include_packets:
+            self.packets.append(time, src, dst, proto, sport, dport, l4)
+            return
+
+        stats = self.stats
+        stats['packet_count'] += 1
+        if src is not None:
+            stats['src_ips'][src] += 1
+            stats['dst_ips'][dst] += 1
+        if l4 is not None:
+            stats['top_ports'][dport] += 1
+            stats['protocols'][l4] += 1
+
+    def result(self):
+        stats = self.stats
+        if self.include_packets:
+            stats['packet_count'] = len(self.packets)
+            stats['src_ips'], stats['dst_ips'], stats['top_ports'], stats['protocols'] = self.packets.counts()
+        stats['packets'] = self.packets
+        stats['dataframe_data'] = self.packets.to_dataframe()
+        stats['flows'] = self.flows
+        return stats
+
+def _scapy_fields(pkt):
+    """
+    Extracts (time, src, dst, proto, sport, dport, l4, length, tcp flags)
+    from a dissected scapy packet.
+    """
+    src = dst = proto = sport = dport = l4 = None
+    flags = 0
+
+    if IP in pkt:
+        src, dst, proto = pkt[IP].src, pkt[IP].dst, pkt[IP].proto
+    elif IPv6 in pkt:
+        src, dst, proto = pkt[IPv6].src, pkt[IPv6].dst, pkt[IPv6].nh
+        # Report the upper-layer protocol behind any extension headers, as the raw parser does
+        layer = pkt[IPv6].payload
+        while proto in _IPV6_EXTENSION_HEADERS and 'nh' in layer.fields:
+            proto, layer = layer.nh, layer.payload
+
+    if TCP in pkt:
+        sport, dport, l4 = pkt[TCP].sport, pkt[TCP].dport, 'TCP'
+        flags = int(pkt[TCP].flags)
+    elif UDP in pkt:
+        sport, dport, l4 = pkt[UDP].sport, pkt[UDP].dport, 'UDP'
+
+    length = getattr(pkt, 'wirelen', None) or len(pkt)
+    return float(pkt.time), src, dst, proto, sport, dport, l4, length, flags
+
+class _RawCapture:
+    """
+    Minimal reader for the record framing of pcap and pcapng files over a
+    memory-mapped buffer. Raises ValueError for anything else.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        magic = bytes(data[:4])
+        if magic in _PCAP_MAGICS:
+            self.format = 'pcap'
+            self.endian, self.ts_units = _PCAP_MAGICS[magic]
+            self.linktype = struct.unpack_from(self.endian + 'I', data, 20)[0]
+        elif magic == _PCAPNG_SHB:
+            self.format = 'pcapng'
+            self.endian = '<'
+            self.interfaces = []
+        else:
+            raise ValueError("not a pcap or pcapng file")
+
+    def state(self):
+        """
+        Returns the JSON-serializable section state needed to resume reading
+        at the current record (pcapng byte order and interfaces), or None.
+        """
+        if self.format == 'pcap':
+            return None
+        return {'endian': self.endian, 'interfaces': [list(iface) for iface in self.interfaces]}
+
+    def records(self, start=None, stop=None, state=None):
+        """
+        Yields (record offset, timestamp, linktype, frame start, captured
+        length, original length) for the records from offset start (a record
+        boundary, with the state saved there) up to offset stop.
+        """
+        if state is not None:
+            self.endian = state['endian']
+            self.interfaces = [tuple(iface) for iface in state['interfaces']]
+        stop = len(self.data) if stop is None else min(stop, len(self.data))
+        if self.format == 'pcap':
+            return self._pcap_records(24 if start is None else start, stop)
+        return self._pcapng_records(0 if start is None else start, stop)
+
+    def _pcap_records(self, pos, stop):
+        data, size = self.data, len(self.data)
+        header = struct.Struct(self.endian + 'IIII')
+        linktype, ts_units = self.linktype, self.ts_units
+        while pos + 16 <= stop:
+            ts_sec, ts_frac, caplen, wirelen = header.unpack_from(data, pos)
+            start = pos + 16
+            if start + caplen > size:
+                break
+            yield pos, ts_sec + ts_frac / ts_units, linktype, start, caplen, wirelen
+            pos = start + caplen
+
+    def _pcapng_records(self, pos, stop):
+        data, size = self.data, len(self.data)
+        while pos + 12 <= stop:
+            if data[pos:pos + 4] == _PCAPNG_SHB:
+                # Section header: byte order may change, interfaces reset
+                self.endian = '<' if data[pos + 8:pos + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+                self.interfaces = []
+            endian, interfaces = self.endian, self.interfaces
+            block_type, block_len = struct.unpack_from(endian + 'II', data, pos)
+            if block_len < 12 or pos + block_len > size:
+                break
+
+            if block_type == 1:
+                interfaces.append(self._interface(data, pos, block_len, endian))
+            elif block_type == 6:
+                iface, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + 'IIIII', data, pos + 8)
+                linktype, ts_units = interfaces[iface]
+                yield pos, ((ts_high << 32) | ts_low) / ts_units, linktype, pos + 28, caplen, wirelen
+            elif block_type == 2:
+                iface, _, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + 'HHIIII', data, pos + 8)
+                linktype, ts_units = interfaces[iface]
+                yield pos, ((ts_high << 32) | ts_low) / ts_units, linktype, pos + 28, caplen, wirelen
+            elif block_type == 3:
+                wirelen = struct.unpack_from(endian + 'I', data, pos + 8)[0]
+                caplen = min(wirelen, block_len - 16)
+                yield pos, float('nan'), interfaces[0][0], pos + 12, caplen, wirelen
+
+            pos += block_len
+
+    @staticmethod
+    def _interface(data, pos, block_len, endian):
+        """Returns (linktype, timestamp units) from an Interface Description Block."""
+        linktype = struct.unpack_from(endian + 'H', data, pos + 8)[0]
+        ts_units = 1e6
+        opt = pos + 16
+        end = pos + block_len - 4
+        while opt + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', data, opt)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                resolution = data[opt + 4]
+                ts_units = 2 ** (resolution & 0x7F) if resolution & 0x80 else 10 ** resolution
+            opt += 4 + (length + 3) // 4 * 4
+        return linktype, ts_units
+
+def _network_layer(data, pos, end, linktype):
+    """
+    Locates the IP header of a frame. Returns (IP version, offset), with a
+    version of None for non-IP frames, or _UNSUPPORTED for unknown link types.
+    """
+    if linktype == _LINKTYPE_ETHERNET:
+        if pos + 14 > end:
+            return None, pos
+        ethertype = struct.unpack_from('>H', data, pos + 12)[0]
+        pos += 14
+        while ethertype in _VLAN_ETHERTYPES and pos + 4 <= end:
+            ethertype = struct.unpack_from('>H', data, pos + 2)[0]
+            pos += 4
+    elif linktype in _LINKTYPE_RAW or linktype in (_LINKTYPE_IPV4, _LINKTYPE_IPV6):
+        if pos >= end:
+            return None, pos
+        version = data[pos] >> 4
+        return (version if version in (4, 6) else None), pos
+    elif linktype == _LINKTYPE_LINUX_SLL:
+        if pos + 16 > end:
+            return None, pos
+        ethertype = struct.unpack_from('>H', data, pos + 14)[0]
+        pos += 16
+    elif linktype == _LINKTYPE_LINUX_SLL2:
+        if pos + 20 > end:
+            return None, pos
+        ethertype = struct.unpack_from('>H', data, pos)[0]
+        pos += 20
+    elif linktype == _LINKTYPE_NULL:
+        if pos + 4 > end:
+            return None, pos
+        # The address family is in the capturing host's byte order
+        family = data[pos] or data[pos + 3]
+        version = 4 if family == 2 else 6 if family in (10, 24, 28, 30) else None
+        return version, pos + 4
+    else:
+        return _UNSUPPORTED
+
+    return {0x0800: 4, 0x86DD: 6}.get(ethertype), pos
+
+def _parse_frame(data, pos, end, linktype):
+    """
+    Decodes the IP and TCP/UDP headers of a frame straight from the buffer.
+    Returns (src, dst, proto, sport, dport, l4, tcp flags) with packed addresses, or
+    _UNSUPPORTED for link types that need scapy.
+    """
+    network = _network_layer(data, pos, end, linktype)
+    if network is _UNSUPPORTED:
+        return _UNSUPPORTED
+    version, pos = network
+
+    if version == 4:
+        if pos + 20 > end:
+            return None, None, None, None, None, None, 0
+        header_len = (data[pos] & 0x0F) * 4
+        fragment_offset = struct.unpack_from('>H', data, pos + 6)[0] & 0x1FFF
+        proto = data[pos + 9]
+        src, dst = data[pos + 12:pos + 16], data[pos + 16:pos + 20]
+        if header_len < 20:
+            # Malformed IHL: the transport header cannot be located (scapy does not decode one either)
+            return src, dst, proto, None, None, None, 0
+        pos += header_len
+    elif version == 6:
+        if pos + 40 > end:
+            return None, None, None, None, None, None, 0
+        proto = data[pos + 6]
+        src, dst = data[pos + 8:pos + 24], data[pos + 24:pos + 40]
+        fragment_offset = 0
+        pos += 40
+        while proto in _IPV6_EXTENSION_HEADERS and pos + 8 <= end:
+            if proto == 44:
+                fragment_offset = struct.unpack_from('>H', data, pos + 2)[0] >> 3
+                proto = data[pos]
+                pos += 8
+            else:
+                proto, pos = data[pos], pos + (data[pos + 1] + 1) * 8
+    else:
+        return None, None, None, None, None, None, 0
+
+    # Only the first fragment carries the transport header
+    if fragment_offset == 0:
+        if proto == 6 and pos + 20 <= end:
+            sport, dport = struct.unpack_from('>HH', data, pos)
+            flags = data[pos + 13] | (data[pos + 12] & 0x01) << 8
+            return src, dst, proto, sport, dport, 'TCP', flags
+        if proto == 17 and pos + 8 <= end:
+            sport, dport = struct.unpack_from('>HH', data, pos)
+            return src, dst, proto, sport, dport, 'UDP', 0
+    return src, dst, proto, None, None, None, 0
+
+def _address(packed, names):
+    """Converts a packed IPv4/IPv6 address to text, memoizing in names."""
+    name = names.get(packed)
+    if name is None:
+        family = socket.AF_INET if len(packed) == 4 else socket.AF_INET6
+        name = names[packed] = socket.inet_ntop(family, packed)
+    return name
+
+def _epoch(value, default):
+    """Converts a time range bound (epoch seconds, datetime or string; naive means UTC) to epoch seconds."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return ts.timestamp()
+
+def _time_bounds(time_range):
+    """Returns (start, end) epoch seconds of an inclusive time range, either end open if None."""
+    if time_range is None:
+        return None
+    start, end = time_range
+    return _epoch(start, float('-inf')), _epoch(end, float('inf'))
+
+class _TimeIndexBuilder:
+    """
+    Collects time index entries during a full pass over a capture: one
+    [min ts, max ts, offset, reader state] entry per block_size bytes of records.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.blocks = []
+        self._block_end = -1
+
+    def add(self, offset, ts, capture):
+        if offset >= self._block_end:
+            self.blocks.append([float('inf'), float('-inf'), offset, capture.state()])
+            self._block_end = offset + self.block_size
+        block = self.blocks[-1]
+        # NaN timestamps (pcapng simple packets) never match a time range
+        if ts < block[0]:
+            block[0] = ts
+        if ts > block[1]:
+            block[1] = ts
+
+def _time_index_key(pcap_path):
+    """Identifies the capture contents a time index is valid for."""
+    st = os.stat(pcap_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _load_time_index(index_path, pcap_path):
+    """Returns the saved time index blocks if they match the capture, otherwise None."""
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable time index {index_path}: {e}")
+        return None
+    if index.get('key') != _time_index_key(pcap_path):
+        logger.warning(f"Ignoring time index {index_path}: the capture has changed")
+        return None
+    return index['blocks']
+
+def _save_time_index(index_path, pcap_path, blocks):
+    """Atomically writes the time index, logging instead of failing if it cannot be written."""
+    tmp_path = index_path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': _time_index_key(pcap_path), 'blocks': blocks}, f)
+        os.replace(tmp_path, index_path)
+        logger.info(f"Time index written to {index_path}: {len(blocks)} blocks")
+    except OSError as e:
+        logger.warning(f"Could not write time index {index_path}: {e}")
+
+def _index_spans(blocks, bounds):
+    """
+    Yields (start, stop, state) record spans covering the index blocks
+    whose timestamps overlap bounds, merging adjacent blocks.
+    """
+    span = None
+    for i, (min_ts, max_ts, offset, state) in enumerate(blocks):
+        if max_ts < bounds[0] or min_ts > bounds[1]:
+            continue
+        stop = blocks[i + 1][2] if i + 1 < len(blocks) else None
+        if span is not None and span[1] == offset:
+            span[1] = stop
+            continue
+        if span is not None:
+            yield tuple(span)
+        span = [offset, stop, state]
+    if span is not None:
+        yield tuple(span)
+
+def _analyze_raw(capture, builder, bounds=None, blocks=None, indexer=None):
+    """
+    Feeds the packets of a _RawCapture to builder using the raw header
+    parser; frames of unknown link types are dissected with scapy. With
+    time index blocks, only the records of blocks overlapping bounds are
+    read; otherwise every record is read and fed to indexer, if given.
+    """
+    data = capture.data
+    names = {}
+    fallback = 0
+
+    if blocks is not None and bounds is not None:
+        spans = _index_spans(blocks, bounds)
+    else:
+        spans = [(None, None, None)]
+
+    for span_start, span_stop, state in spans:
+        for offset, ts, linktype, start, caplen, wirelen in capture.records(span_start, span_stop, state):
+            if indexer is not None:
+                indexer.add(offset, ts, capture)
+            if bounds is not None and not bounds[0] <= ts <= bounds[1]:
+                continue
+
+            fields = _parse_frame(data, start, start + caplen, linktype)
+            if fields is _UNSUPPORTED:
+                pkt = conf.l2types.get(linktype, conf.raw_layer)(bytes(data[start:start + caplen]))
+                pkt.time, pkt.wirelen = ts, wirelen
+                builder.add(*_scapy_fields(pkt))
+                fallback += 1
+                continue
+
+            src, dst, proto, sport, dport, l4, flags = fields
+            if src is not None:
+                src, dst = _address(src, names), _address(dst, names)
+            builder.add(ts, src, dst, proto, sport, dport, l4, wirelen, flags)
+
+    if fallback:
+        logger.info(f"{fallback} packets with unsupported link types were dissected with scapy")
+
+def analyze_pcap(pcap_path, include_packets=True, fast=True, flows=True,
+                 flow_timeout=FLOW_IDLE_TIMEOUT, on_flow_expire=None, time_range=None, time_index=False):
     """
     Analyzes a PCAP file to extract summary statistics.
 
+    Packets are streamed from the capture (pcap or pcapng) one at a time and
+    the counters are updated incrementally, so memory does not grow with the
+    capture size unless the per-packet table is requested.
+
+    By default pcap/pcapng files are decoded by a raw header parser over a
+    memory-mapped file instead of full scapy dissection. Only frames of link
+    types it does not understand, or files it cannot read, go through scapy.
+
     Args:
         pcap_path (str): Path to the .pcap file.
+        include_packets (bool): Collect the per-packet table in 'packets'.
+            Disable for bounded memory on very large captures.
+        fast (bool): Use the raw header parser where possible.
+        flows (bool): Aggregate IP packets into a FlowTable. Its memory
+            grows with the number of flows unless on_flow_expire is given.
+        flow_timeout (float): Idle seconds after which a flow is expired.
+        on_flow_expire (callable): Receives each flow as a dict when it
+            expires, including all remaining flows at the end of the capture,
+            instead of the flows being kept in memory. Needed for bounded
+            memory on long captures; 'flows' is then left empty.
+        time_range (tuple): Only analyze packets with start <= time <= end.
+            Bounds are epoch seconds, datetimes or date strings (naive
+            values are UTC); None leaves that end open.
+        time_index (bool or str): Use a sidecar time index (True for
+            pcap_path + '.tidx', or a path). A missing or outdated index is
+            rebuilt during a full pass; a valid one lets time_range queries
+            read only the matching parts of the capture. Off by default so
+            nothing is written next to evidence unless asked for.
 
     Returns:
         dict: A dictionary containing:
@@ -18,67 +773,210 @@ def analyze_pcap(pcap_path):
             - 'dst_ips': Counter of destination IPs.
             - 'top_ports': Counter of destination ports.
             - 'protocols': Counter of protocols (TCP/UDP).
-            - 'dataframe_data': List of dicts for DataFrame creation.
+            - 'packets': PacketTable of per-packet columns
+              (empty if include_packets is False).
+            - 'dataframe_data': DataFrame view of 'packets'.
+            - 'flows': FlowTable of per-flow statistics (None if flows is False).
     """
     if not os.path.isfile(pcap_path):
         logger.error(f"File not found: {pcap_path}")
         return None
 
     try:
-        packets = rdpcap(pcap_path)
-        logger.info(f"Loaded {len(packets)} packets from {pcap_path}")
+        bounds = _time_bounds(time_range)
+        flow_table = FlowTable(flow_timeout, on_flow_expire) if flows else None
+        builder = _StatsBuilder(include_packets, flow_table)
+        parsed = False
+        if fast and os.path.getsize(pcap_path) > 0:
+            index_path = blocks = indexer = None
+            if time_index:
+                index_path = pcap_path + TIME_INDEX_SUFFIX if time_index is True else time_index
+                blocks = _load_time_index(index_path, pcap_path)
+                if blocks is None:
+                    indexer = _TimeIndexBuilder(TIME_INDEX_BLOCK)
 
-        stats = {
-            'packet_count': len(packets),
-            'src_ips': Counter(),
-            'dst_ips': Counter(),
-            'top_ports': Counter(),
-            'protocols': Counter(),
-            'dataframe_data': []
-        }
+            with open(pcap_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    # Only the format check may fall back: builder must not have seen any packets
+                    try:
+                        capture = _RawCapture(data)
+                    except ValueError:
+                        logger.info(f"{pcap_path} is not plain pcap/pcapng, falling back to scapy")
+                    else:
+                        _analyze_raw(capture, builder, bounds, blocks, indexer)
+                        parsed = True
+
+            if parsed and indexer is not None:
+                _save_time_index(index_path, pcap_path, indexer.blocks)
+
+        if not parsed:
+            with PcapReader(pcap_path) as reader:
+                for pkt in reader:
+                    fields = _scapy_fields(pkt)
+                    if bounds is None or bounds[0] <= fields[0] <= bounds[1]:
+                        builder.add(*fields)
+
+        if flow_table is not None and on_flow_expire is not None:
+            flow_table.expire_all()
 
-        for pkt in packets:
-            pkt_info = {'time': float(pkt.time), 'src': None, 'dst': None, 'proto': None, 'sport': None, 'dport': None}
-            
-            if IP in pkt:
-                stats['src_ips'][pkt[IP].src] += 1
-                stats['dst_ips'][pkt[IP].dst] += 1
-                pkt_info['src'] = pkt[IP].src
-                pkt_info['dst'] = pkt[IP].dst
-                pkt_info['proto'] = pkt[IP].proto
-
-            if TCP in pkt:
-                stats['top_ports'][pkt[TCP].dport] += 1
-                stats['protocols']['TCP'] += 1
-                pkt_info['sport'] = pkt[TCP].sport
-                pkt_info['dport'] = pkt[TCP].dport
-            elif UDP in pkt:
-                stats['top_ports'][pkt[UDP].dport] += 1
-                stats['protocols']['UDP'] += 1
-                pkt_info['sport'] = pkt[UDP].sport
-                pkt_info['dport'] = pkt[UDP].dport
-            
-            stats['dataframe_data'].append(pkt_info)
-
-        logger.info(f"Analysis complete for {pcap_path}")
+        stats = builder.result()
+        logger.info(f"Analysis complete for {pcap_path}: {stats['packet_count']} packets")
         return stats
 
     except Exception as e:
         logger.error(f"Error analyzing PCAP {pcap_path}: {e}")
         return None
 
-def export_pcap_csv(stats, output_path):
+def _analyze_one(args):
+    """Worker for analyze_pcaps: analyzes one capture and drops the DataFrame view before pickling."""
+    pcap_path, kwargs = args
+    stats = analyze_pcap(pcap_path, **kwargs)
+    if stats is not None:
+        del stats['dataframe_data']
+    return pcap_path, stats
+
+def merge_stats(results, flow_timeout=FLOW_IDLE_TIMEOUT):
+    """
+    Merges analyze_pcap results into one: counts and Counters are summed,
+    packet tables are combined in time order and flow tables are joined
+    across files.
+
+    Args:
+        results (list): Stats dicts as returned by analyze_pcap.
+        flow_timeout (float): Idle seconds that still join a flow across files.
+
+    Returns:
+        dict: Combined stats with the same keys as analyze_pcap.
+    """
+    merged = {
+        'packet_count': 0,
+        'src_ips': Counter(),
+        'dst_ips': Counter(),
+        'top_ports': Counter(),
+        'protocols': Counter(),
+    }
+    for stats in results:
+        merged['packet_count'] += stats['packet_count']
+        for key in ('src_ips', 'dst_ips', 'top_ports', 'protocols'):
+            merged[key].update(stats[key])
+
+    merged['packets'] = PacketTable.merge([stats['packets'] for stats in results])
+    merged['dataframe_data'] = merged['packets'].to_dataframe()
+    flow_tables = [stats['flows'] for stats in results if stats.get('flows') is not None]
+    merged['flows'] = FlowTable.merge(flow_tables, flow_timeout) if flow_tables else None
+    return merged
+
+def analyze_pcaps(paths, workers=None, include_packets=True, fast=True, flows=True,
+                  flow_timeout=FLOW_IDLE_TIMEOUT, time_range=None, time_index=False):
+    """
+    Analyzes many captures, such as a directory of rotated tcpdump files, on
+    a process pool and merges the results with merge_stats.
+
+    Args:
+        paths (str or list): Capture files and/or directories to search.
+        workers (int): Worker processes; defaults to the number of CPUs.
+        include_packets (bool): Collect the per-packet tables.
+        fast (bool): Use the raw header parser where possible.
+        flows (bool): Aggregate IP packets into flows.
+        flow_timeout (float): Idle seconds after which a flow is expired.
+        time_range (tuple): Only analyze packets in this window (see analyze_pcap).
+        time_index (bool): Use a sidecar time index next to each capture.
+
+    Returns:
+        dict: Combined stats as returned by analyze_pcap, plus 'files', the
+        list of captures analyzed successfully. None if no capture could be
+        analyzed.
+    """
+    kwargs = {'include_packets': include_packets, 'fast': fast, 'flows': flows, 'flow_timeout': flow_timeout,
+              'time_range': time_range, 'time_index': bool(time_index)}
+    jobs = [(path, kwargs) for path in iter_files(paths, _CAPTURE_NAME.search)]
+    if not jobs:
+        logger.error(f"No capture files found in {paths}")
+        return None
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_analyze_one, jobs))
+        else:
+            results = [_analyze_one(job) for job in jobs]
+    except Exception as e:
+        logger.error(f"Error analyzing captures: {e}")
+        return None
+
+    analyzed = [(path, stats) for path, stats in results if stats is not None]
+    for path, stats in results:
+        if stats is None:
+            logger.warning(f"Skipping capture that could not be analyzed: {path}")
+    if not analyzed:
+        return None
+
+    merged = merge_stats([stats for _, stats in analyzed], flow_timeout)
+    merged['files'] = [path for path, _ in analyzed]
+    logger.info(f"Analysis complete for {len(analyzed)} captures: {merged['packet_count']} packets")
+    return merged
+
+def _packet_chunks(stats, bounds, chunk_rows):
+    """Yields the packet table of stats as DataFrame chunks, filtered to bounds."""
+    if 'packets' in stats:
+        table = stats['packets']
+        chunks = (table.to_dataframe(start, start + chunk_rows) for start in range(0, max(len(table), 1), chunk_rows))
+    else:
+        chunks = [pd.DataFrame(stats['dataframe_data'])]
+    for df in chunks:
+        if bounds is not None and len(df):
+            df = df[df['time'].between(*bounds)]
+        yield df
+
+def export_pcap(stats, output_path, fmt=None, time_range=None, compression=None, chunk_rows=CHUNK_ROWS):
     """
-    Exports PCAP analysis data to CSV.
+    Exports the per-packet table of a PCAP analysis in chunks, so memory
+    use does not grow with the capture.
+
+    Args:
+        stats (dict): Result of analyze_pcap / analyze_pcaps.
+        output_path (str): Destination file.
+        fmt (str): 'csv', 'parquet' or 'feather'; by default taken from the
+            file extension (see dft.utils.exporter.export_table).
+        time_range (tuple): Only export packets within this window (see analyze_pcap).
+        compression (str): Codec override.
+        chunk_rows (int): Rows converted and written at a time.
+
+    Returns:
+        bool: True if successful, False otherwise.
     """
-    if not stats or 'dataframe_data' not in stats:
+    if not stats or ('packets' not in stats and 'dataframe_data' not in stats):
         return False
-    
+
+    try:
+        chunks = _packet_chunks(stats, _time_bounds(time_range), chunk_rows)
+    except Exception as e:
+        logger.error(f"Error exporting PCAP data: {e}")
+        return False
+    if export_table(chunks, output_path, fmt, compression, chunk_rows) is None:
+        return False
+    logger.info(f"PCAP data exported to {output_path}")
+    return True
+
+def export_pcap_csv(stats, output_path, time_range=None):
+    """
+    Exports PCAP analysis data to CSV, optionally only the packets within
+    time_range (see analyze_pcap).
+    """
+    return export_pcap(stats, output_path, 'csv', time_range)
+
+def export_flows_csv(stats, output_path):
+    """
+    Exports the flow table of a PCAP analysis to CSV.
+    """
+    if not stats or stats.get('flows') is None:
+        return False
+
     try:
-        df = pd.DataFrame(stats['dataframe_data'])
-        df.to_csv(output_path, index=False)
-        logger.info(f"PCAP data exported to {output_path}")
+        stats['flows'].to_dataframe().to_csv(output_path, index=False)
+        logger.info(f"Flow data exported to {output_path}")
         return True
     except Exception as e:
-        logger.error(f"Error exporting PCAP CSV: {e}")
+        logger.error(f"Error exporting flow CSV: {e}")
         return False
@@ -0,0 +1,142 @@
+import gzip
+import os
+import pandas as pd
+from dft.utils.logger import logger
+
+# Parquet and Feather export need pyarrow; CSV works without it
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+# Rows converted and written at a time
+CHUNK_ROWS = 100000
+
+FORMATS = ('csv', 'parquet', 'feather')
+
+_EXTENSIONS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+def detect_format(output_path):
+    """Returns the export format for a file name, defaulting to 'csv'."""
+    name = str(output_path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return _EXTENSIONS.get(os.path.splitext(name)[1], 'csv')
+
+class TableWriter:
+    """
+    Writes a table to CSV, Parquet or Feather one chunk at a time, so only
+    the current chunk is ever held in memory. The first chunk fixes the
+    columns and, for Parquet/Feather, the typed schema.
+    """
+
+    def __init__(self, output_path, fmt=None, compression=None):
+        self.output_path = str(output_path)
+        self.fmt = fmt or detect_format(output_path)
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {self.fmt}")
+        if self.fmt != 'csv' and pa is None:
+            raise ImportError(f"pyarrow is required to export {self.fmt}")
+        if compression is None:
+            if self.fmt == 'csv':
+                compression = 'gzip' if self.output_path.lower().endswith('.gz') else None
+            else:
+                compression = 'zstd'
+        self.compression = compression
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        """Appends a chunk (DataFrame or list of dicts)."""
+        df = chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
+        if self.fmt == 'csv':
+            self._write_csv(df)
+        else:
+            self._write_arrow(df)
+        self.rows += len(df)
+
+    def _write_csv(self, df):
+        header = self._file is None
+        if header:
+            if self.compression == 'gzip':
+                self._file = gzip.open(self.output_path, 'wt', newline='')
+            else:
+                self._file = open(self.output_path, 'w', newline='')
+        df.to_csv(self._file, index=False, header=header)
+
+    def _write_arrow(self, df):
+        if self._writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Columns that are all None in the first chunk are taken to be text
+            self._schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                      for field in table.schema], metadata=table.schema.metadata)
+            table = table.cast(self._schema)
+            if self.fmt == 'parquet':
+                self._writer = pa.parquet.ParquetWriter(self.output_path, self._schema, compression=self.compression)
+            else:
+                self._file = pa.OSFile(self.output_path, 'wb')
+                options = pa.ipc.IpcWriteOptions(compression=self.compression)
+                self._writer = pa.ipc.new_file(self._file, self._schema, options=options)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_chunks(data, chunk_rows=CHUNK_ROWS):
+    """
+    Yields DataFrame chunks of at most chunk_rows rows from a DataFrame, a
+    list of dicts, or an iterable of such chunks (e.g. a batch generator).
+    """
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, max(len(data), 1), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+    elif isinstance(data, list) and (not data or isinstance(data[0], dict)):
+        for start in range(0, max(len(data), 1), chunk_rows):
+            yield pd.DataFrame(data[start:start + chunk_rows])
+    else:
+        for chunk in data:
+            yield from iter_chunks(chunk, chunk_rows)
+
+def export_table(data, output_path, fmt=None, compression=None, chunk_rows=CHUNK_ROWS):
+    """
+    Exports tabular results in chunks as they are produced.
+
+    Args:
+        data: DataFrame, list of dicts, or an iterable of DataFrame / list
+            chunks; iterables are consumed lazily.
+        output_path (str): Destination file.
+        fmt (str): 'csv', 'parquet' or 'feather'; by default taken from the
+            file extension (.csv[.gz], .parquet/.pq, .feather/.arrow).
+        compression (str): Codec override, e.g. 'gzip' for CSV or 'snappy'
+            for Parquet; Parquet/Feather default to zstd.
+        chunk_rows (int): Rows converted and written at a time.
+
+    Returns:
+        int: Number of rows written, or None if an error occurs. An iterable
+            that yields no chunks at all leaves no file behind and returns 0.
+    """
+    try:
+        with TableWriter(output_path, fmt, compression) as writer:
+            for chunk in iter_chunks(data, chunk_rows):
+                writer.write(chunk)
+        if writer.rows == 0:
+            logger.warning(f"No rows to export to {output_path}")
+        return writer.rows
+    except Exception as e:
+        logger.error(f"Error exporting to {output_path}: {e}")
+        return None
@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+
+def iter_files(paths, match=None):
+    """
+    Yields file paths from a file or directory, or a list of them, walking
+    directories recursively in sorted order.
+
+    Args:
+        paths (str or list): A file or directory, or a list of them.
+        match (callable): Optional filter on the names of files found in
+            directories, e.g. by extension. Explicitly listed files are
+            always yielded.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if match is None or match(name):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def bounded_map(pool, fn, items, limit):
+    """
+    Runs fn on each item on an executor, keeping at most limit tasks in
+    flight. Items are pulled lazily, so arbitrarily long iterables (such as
+    an iter_files walk) are processed in constant memory.
+
+    Args:
+        pool (Executor): Thread or process pool to submit to.
+        fn (callable): Task run as fn(item); must be picklable for process pools.
+        items (iterable): Task arguments.
+        limit (int): Maximum number of submitted, unfinished tasks.
+
+    Yields:
+        tuple: (item, fn(item)) in completion order. Exceptions raised by fn
+            propagate to the caller.
+    """
+    pending = {}
+    for item in items:
+        pending[pool.submit(fn, item)] = item
+        if len(pending) >= limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
@@ -4,8 +4,8 @@ import os
 import threading
 
 # Import modules
-from dft.modules.hashcalc import calculate_hashes
-from dft.modules.exif_extractor import extract_exif
+from dft.modules.hashcalc import calculate_hashes, hash_files
+from dft.modules.exif_extractor import extract_exif, extract_exif_batch
 from dft.modules.pcap_analyzer import analyze_pcap, export_pcap_csv
 from dft.modules.browser_history import parse_browser_history, export_history_csv
 from dft.modules.file_carver import carve_files
@@ -161,8 +161,14 @@ class DFTApp:
         desc = tk.Label(frame, text="Calculate MD5, SHA1, and SHA256 hashes.", bg=COLORS["bg_panel"], fg=COLORS["fg_text"])
         desc.pack(anchor="w", padx=10, pady=(5,0))
 
-        btn = ttk.Button(frame, text="SELECT FILE", style="Accent.TButton", command=self.run_hash)
-        btn.pack(anchor="w", padx=10, pady=10)
+        btn_frame = tk.Frame(frame, bg=COLORS["bg_panel"])
+        btn_frame.pack(anchor="w", padx=10, pady=10)
+
+        btn = ttk.Button(btn_frame, text="SELECT FILE", style="Accent.TButton", command=self.run_hash)
+        btn.pack(side=tk.LEFT, padx=(0, 10))
+
+        btn_folder = ttk.Button(btn_frame, text="SELECT FOLDER", command=self.run_hash_folder)
+        btn_folder.pack(side=tk.LEFT)
         
         self.hash_output = self.create_scrolled_text(tab)
 
@@ -189,6 +195,35 @@ class DFTApp:
 
         threading.Thread(target=task).start()
 
+    def run_hash_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+
+        self.log(f"Calculating hashes for files in {os.path.basename(folder)}...")
+        self.hash_output.delete(1.0, tk.END)
+
+        def task():
+            out = f"FOLDER: {folder}\n"
+            out += "-" * 60 + "\n"
+            total = failed = 0
+            for path, hashes in hash_files(folder):
+                total += 1
+                if hashes is None:
+                    failed += 1
+                    continue
+                if total <= 500:
+                    out += f"{os.path.relpath(path, folder)}\n"
+                    for algo, val in hashes.items():
+                        out += f"  {algo.upper():<8}: {val}\n"
+            if total > 500:
+                out += f"\n... and {total - 500} more files.\n"
+            out += f"\nHASHED: {total - failed}  FAILED: {failed}\n"
+            self.update_text(self.hash_output, out)
+            self.log("Batch hash calculation complete.")
+
+        threading.Thread(target=task).start()
+
     def init_exif_tab(self):
         tab = ttk.Frame(self.notebook)
         self.notebook.add(tab, text="EXIF")
@@ -196,8 +231,14 @@ class DFTApp:
         frame = ttk.LabelFrame(tab, text=" METADATA EXTRACTION ")
         frame.pack(padx=15, pady=15, fill='x')
         
-        btn = ttk.Button(frame, text="LOAD IMAGE", style="Accent.TButton", command=self.run_exif)
-        btn.pack(anchor="w", padx=10, pady=10)
+        btn_frame = tk.Frame(frame, bg=COLORS["bg_panel"])
+        btn_frame.pack(anchor="w", padx=10, pady=10)
+
+        btn = ttk.Button(btn_frame, text="LOAD IMAGE", style="Accent.TButton", command=self.run_exif)
+        btn.pack(side=tk.LEFT, padx=(0, 10))
+
+        btn_folder = ttk.Button(btn_frame, text="SELECT FOLDER", command=self.run_exif_folder)
+        btn_folder.pack(side=tk.LEFT)
         
         self.exif_output = self.create_scrolled_text(tab)
 
@@ -227,6 +268,37 @@ class DFTApp:
                 
         threading.Thread(target=task).start()
 
+    def run_exif_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+
+        self.log(f"Extracting EXIF for images in {os.path.basename(folder)}...")
+        self.exif_output.delete(1.0, tk.END)
+
+        def task():
+            out = f"FOLDER: {folder}\n"
+            out += "-" * 60 + "\n"
+            total = failed = with_exif = 0
+            for path, data in extract_exif_batch(folder):
+                total += 1
+                if data is None:
+                    failed += 1
+                    continue
+                if data:
+                    with_exif += 1
+                    if with_exif <= 200:
+                        camera = f"{data.get('Make', '')} {data.get('Model', '')}".strip() or "-"
+                        taken = data.get('DateTimeOriginal', data.get('DateTime', '-'))
+                        out += f"{os.path.relpath(path, folder):<40} {camera:<25} {taken}\n"
+            if with_exif > 200:
+                out += f"\n... and {with_exif - 200} more images with EXIF.\n"
+            out += f"\nIMAGES: {total}  WITH EXIF: {with_exif}  FAILED: {failed}\n"
+            self.update_text(self.exif_output, out)
+            self.log("Batch EXIF extraction complete.")
+
+        threading.Thread(target=task).start()
+
     def init_pcap_tab(self):
         tab = ttk.Frame(self.notebook)
         self.notebook.add(tab, text="PCAP")
@@ -390,8 +462,8 @@ class DFTApp:
                 out = f"SOURCE: {filepath}\n"
                 out += f"DESTINATION: {out_dir}\n"
                 out += "-" * 60 + "\n"
-                out += f"RECOVERED JPGs: {counts['jpg']}\n"
-                out += f"RECOVERED PNGs: {counts['png']}\n"
+                for ext, count in counts.items():
+                    out += f"RECOVERED {ext.upper()}s: {count}\n"
                 self.update_text(self.carver_output, out)
                 self.log("File carving complete.")
             else:
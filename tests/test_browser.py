@@ -1,6 +1,11 @@
+import os
 import pytest
 import sqlite3
-from dft.modules.browser_history import parse_browser_history
+import pandas as pd
+from datetime import datetime, timezone
+import numpy as np
+from dft.modules.browser_history import (parse_browser_history, iter_browser_history, sweep_browser_history,
+                                        export_history, datetime_to_webkit)
 
 def test_parse_browser_history(tmp_path):
     # Create a dummy SQLite database
@@ -32,3 +37,137 @@ def test_parse_browser_history(tmp_path):
 def test_parse_browser_history_file_not_found():
     history = parse_browser_history("non_existent.sqlite")
     assert history is None
+
+def test_parse_browser_history_batches_and_dataframe(tmp_path):
+    db_path = tmp_path / "History"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER)")
+    rows = [(f"https://site{i}.example/", f"Site {i}", i, 13345678900000000 + i * 1000000) for i in range(25)]
+    rows += [("https://never.example/", None, 0, 0), ("https://null.example/", None, 0, None)]
+    conn.executemany("INSERT INTO urls (url, title, visit_count, last_visit_time) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    batches = list(iter_browser_history(str(db_path), batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 7]
+
+    history = parse_browser_history(str(db_path), batch_size=10)
+    assert history == [entry for batch in batches for entry in batch]
+    assert history[0] == {'url': "https://site24.example/", 'title': "Site 24", 'visit_count': 24,
+                          'last_visit_time': "2023-11-28 21:02:04"}
+    assert [entry['last_visit_time'] for entry in history[-2:]] == ["N/A", "N/A"]
+
+    df = parse_browser_history(str(db_path), as_dataframe=True, batch_size=10)
+    assert list(df.columns) == ['url', 'title', 'visit_count', 'last_visit_time']
+    assert len(df) == 27
+    assert df['last_visit_time'].iloc[0] == pd.Timestamp("2023-11-28 21:02:04")
+    assert df['last_visit_time'].iloc[-2:].isna().all()
+
+def make_chrome_history(db_path):
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript("""
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER);
+        CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER, from_visit INTEGER, transition INTEGER, segment_id INTEGER, visit_duration INTEGER);
+        CREATE INDEX visits_time_index ON visits (visit_time);
+        CREATE TABLE downloads (id INTEGER PRIMARY KEY, guid VARCHAR, current_path LONGVARCHAR, target_path LONGVARCHAR, start_time INTEGER, received_bytes INTEGER, total_bytes INTEGER, state INTEGER, end_time INTEGER, referrer VARCHAR, mime_type VARCHAR);
+        CREATE TABLE downloads_url_chains (id INTEGER, chain_index INTEGER, url LONGVARCHAR, PRIMARY KEY (id, chain_index));
+        CREATE TABLE keyword_search_terms (keyword_id INTEGER, url_id INTEGER, term LONGVARCHAR, normalized_term LONGVARCHAR);
+    """)
+    base = 13345678900000000
+    urls = ["https://example.com/", "https://mail.example.com/inbox", "https://notexample.com/",
+            "https://example.com.evil.org/", "http://example.com:8080/admin", "https://search.test/q?x=forensics"]
+    for i, url in enumerate(urls, 1):
+        conn.execute("INSERT INTO urls VALUES (?, ?, ?, ?, 0, ?, 0)", (i, url, f"Page {i}", i, base + i * 60000000))
+        conn.execute("INSERT INTO visits VALUES (?, ?, ?, 0, 805306368, 0, 1500000)", (i, i, base + i * 60000000))
+    conn.execute("INSERT INTO downloads VALUES (1, 'g', '/tmp/x', '/home/u/tool.zip', ?, 10, 10, 1, ?, 'https://example.com/', 'application/zip')",
+                 (base, base + 5000000))
+    conn.executemany("INSERT INTO downloads_url_chains VALUES (?, ?, ?)",
+                     [(1, 0, "https://example.com/get"), (1, 1, "https://cdn.example.com/tool.zip")])
+    conn.execute("INSERT INTO keyword_search_terms VALUES (2, 6, 'Forensics', 'forensics')")
+    conn.commit()
+    conn.close()
+    return base
+
+def test_parse_browser_history_filters_and_tables(tmp_path):
+    db_path = tmp_path / "History"
+    base = make_chrome_history(db_path)
+
+    on_domain = parse_browser_history(str(db_path), domain="Example.com")
+    assert [entry['url'] for entry in on_domain] == [
+        "http://example.com:8080/admin", "https://mail.example.com/inbox", "https://example.com/"]
+
+    window = parse_browser_history(str(db_path), start=base + 2 * 60000000, end="2023-11-28 21:05:40", limit=2)
+    assert [entry['visit_count'] for entry in window] == [4, 3]
+
+    assert len(parse_browser_history(str(db_path), url_pattern="%/admin")) == 1
+
+    visits = parse_browser_history(str(db_path), table='visits', as_dataframe=True, domain="example.com")
+    assert list(visits.columns) == ['url', 'title', 'visit_time', 'from_visit', 'transition', 'visit_duration']
+    assert len(visits) == 3
+    assert visits['visit_time'].iloc[0] == pd.Timestamp("2023-11-28 21:06:40")
+
+    downloads = parse_browser_history(str(db_path), table='downloads')
+    assert downloads == [{'url': "https://cdn.example.com/tool.zip", 'target_path': "/home/u/tool.zip",
+                          'start_time': "2023-11-28 21:01:40", 'end_time': "2023-11-28 21:01:45",
+                          'received_bytes': 10, 'total_bytes': 10, 'state': 1,
+                          'referrer': "https://example.com/", 'mime_type': "application/zip"}]
+
+    terms = parse_browser_history(str(db_path), table='keyword_search_terms')
+    assert [(entry['term'], entry['url']) for entry in terms] == [("Forensics", "https://search.test/q?x=forensics")]
+
+    assert parse_browser_history(str(db_path), table='cookies') is None
+
+    # A filtered stream with no matches exports nothing and says so
+    no_match = iter_browser_history(str(db_path), as_dataframe=True, domain="nomatch.org")
+    assert export_history(no_match, str(tmp_path / "none.csv")) is False
+    assert not (tmp_path / "none.csv").exists()
+
+def test_datetime_to_webkit():
+    expected = 13345679140000000
+    assert datetime_to_webkit("2023-11-28 21:05:40") == expected
+    assert datetime_to_webkit(datetime(2023, 11, 28, 21, 5, 40)) == expected
+    assert datetime_to_webkit("2023-11-28T22:05:40+01:00") == expected
+    assert datetime_to_webkit(datetime(1601, 1, 1, tzinfo=timezone.utc)) == 0
+    assert datetime_to_webkit(np.int64(expected)) == expected
+
+def test_sweep_browser_history(tmp_path):
+    users = tmp_path / "Users"
+    default = users / "alice" / "Chrome" / "Default"
+    second = users / "alice" / "Chrome" / "Profile 2"
+    firefox = users / "bob" / "Firefox" / "abcd.default"
+    for directory in (default, second, firefox):
+        directory.mkdir(parents=True)
+    base = make_chrome_history(default / "History")
+    (users / "alice" / "History").write_text("not a database")
+
+    # A running browser: WAL mode, exclusive lock held, latest rows only in the WAL
+    live = sqlite3.connect(str(second / "History"))
+    live.execute("PRAGMA journal_mode=WAL")
+    live.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER)")
+    live.execute("INSERT INTO urls (url, title, visit_count, last_visit_time) VALUES ('https://live.example.com/', 'Live', 1, ?)",
+                 (base + 600000000,))
+    live.commit()
+    live.execute("PRAGMA locking_mode=EXCLUSIVE")
+    live.execute("UPDATE urls SET visit_count = 2")
+    live.commit()
+
+    places = sqlite3.connect(str(firefox / "places.sqlite"))
+    places.execute("CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER, last_visit_date INTEGER)")
+    places.execute("INSERT INTO moz_places VALUES (1, 'https://www.example.com/ff', 'Firefox', 3, 1701205300000000)")
+    places.commit()
+    places.close()
+
+    try:
+        df = sweep_browser_history(str(users), workers=2, domain="example.com")
+    finally:
+        live.close()
+
+    assert list(df.columns[:2]) == ['profile', 'source']
+    assert df['url'].iloc[0] == "https://live.example.com/"
+    assert df['visit_count'].iloc[0] == 2
+    assert set(df['profile']) == {os.path.join("alice", "Chrome", "Default"), os.path.join("alice", "Chrome", "Profile 2"),
+                                  os.path.join("bob", "Firefox", "abcd.default")}
+    firefox_row = df[df['url'] == "https://www.example.com/ff"].iloc[0]
+    assert firefox_row['last_visit_time'] == pd.Timestamp("2023-11-28 21:01:40")
+    assert len(df) == 5
+    assert sweep_browser_history(str(tmp_path / "missing")) is None
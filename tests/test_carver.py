@@ -1,6 +1,15 @@
 import pytest
 import os
-from dft.modules.file_carver import carve_files
+import struct
+from dft.modules import file_carver
+from dft.modules.file_carver import (carve_files, extract_carved, read_manifest, register_signature,
+                                     Signature, SIGNATURES, CHECKPOINT_NAME, MANIFEST_NAME, MAX_FILE_SIZE,
+                                     OBJECTS_DIR, _scan)
+
+def make_jpeg(comment=b'', scan=b'\x12\x34\xFF\x00\x56'):
+    # Minimal well-formed JPEG: SOI, COM segment, SOS header, scan data, EOI
+    sos = b'\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00'
+    return b'\xFF\xD8\xFF\xFE' + struct.pack('>H', len(comment) + 2) + comment + sos + scan + b'\xFF\xD9'
 
 def test_carve_files(tmp_path):
     # Create a dummy binary file with embedded JPG signature
@@ -8,7 +17,7 @@ def test_carve_files(tmp_path):
     output_dir = tmp_path / "recovered"
     
     # Fake JPG: FF D8 FF ... FF D9
-    fake_jpg = b'\xFF\xD8\xFF\x00\x01\x02\xFF\xD9'
+    fake_jpg = make_jpeg()
     # Fake PNG: 89 PNG ... IEND ...
     fake_png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\x00IEND\xae\x42\x60\x82'
     
@@ -31,3 +40,276 @@ def test_carve_files(tmp_path):
 def test_carve_files_file_not_found():
     counts = carve_files("non_existent.bin", "output")
     assert counts is None
+
+def test_carve_files_footer_beyond_size_limit(tmp_path):
+    # A header whose footer lies past MAX_FILE_SIZE must not swallow later files
+    bin_path = tmp_path / "dump.bin"
+    output_dir = tmp_path / "recovered"
+    fake_gif = b'GIF89a\x01\x00\x01\x00\x00\x3B'
+
+    with open(bin_path, 'wb') as f:
+        f.write(b'GIF89a')
+        f.write(b'\x01' * MAX_FILE_SIZE)
+        f.write(fake_gif)
+
+    counts = carve_files(str(bin_path), str(output_dir))
+
+    assert counts['gif'] == 1
+    assert (output_dir / "recovered_0.gif").read_bytes() == fake_gif
+
+def test_carve_files_structure_aware_extents(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    output_dir = tmp_path / "recovered"
+
+    # The embedded thumbnail's EOI must not end the outer JPEG
+    thumbnail = make_jpeg()
+    photo = make_jpeg(comment=thumbnail, scan=b'\xAB' * 100 + b'\xFF\xD0' + b'\xCD' * 100)
+    # A PNG with a corrupted chunk CRC must be rejected rather than written
+    bad_png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\x01abcdX\x00\x00\x00\x00\x00\x00\x00\x00IEND\xae\x42\x60\x82'
+
+    with open(bin_path, 'wb') as f:
+        f.write(b'junk' + photo + b'junk' + bad_png)
+        # A truncated JPEG: scan data runs off the end without an EOI
+        f.write(make_jpeg()[:-2])
+
+    counts = carve_files(str(bin_path), str(output_dir))
+
+    assert counts['jpg'] == 1
+    assert counts['png'] == 0
+    assert (output_dir / "recovered_0.jpg").read_bytes() == photo
+
+def test_carve_files_empty_image(tmp_path):
+    bin_path = tmp_path / "empty.bin"
+    bin_path.write_bytes(b'')
+
+    counts = carve_files(str(bin_path), str(tmp_path / "recovered"))
+    assert counts is not None
+    assert all(count == 0 for count in counts.values())
+
+def test_carve_files_registry_types(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    output_dir = tmp_path / "recovered"
+
+    fake_gif = b'GIF89a\x01\x00\x01\x00\x00\x3B'
+    # Local file header, then an End Of Central Directory record with a 3 byte comment
+    fake_zip = b'PK\x03\x04' + b'\x00' * 26 + b'PK\x05\x06' + b'\x00' * 16 + b'\x03\x00abc'
+
+    with open(bin_path, 'wb') as f:
+        f.write(b'junk' + fake_gif + b'junk' + fake_zip + b'junk')
+
+    counts = carve_files(str(bin_path), str(output_dir))
+
+    assert counts['gif'] == 1
+    assert counts['zip'] == 1
+    assert (output_dir / "recovered_0.gif").read_bytes() == fake_gif
+    assert (output_dir / "recovered_0.zip").read_bytes() == fake_zip
+
+def test_carve_files_custom_signature(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    bin_path.write_bytes(b'junk' + b'DFTX' + b'payload' + b'XTFD' + b'junk')
+
+    register_signature(Signature('dftx', (b'DFTX',), b'XTFD'))
+    try:
+        counts = carve_files(str(bin_path), str(tmp_path / "recovered"), types=['dftx'])
+    finally:
+        del SIGNATURES['dftx']
+
+    assert counts == {'dftx': 1}
+
+def test_scan_header_across_window_boundary():
+    data = b'\x00' * 14 + b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\x00IEND\xae\x42\x60\x82'
+    hits = list(_scan(data, [SIGNATURES['png']], window=16))
+    assert [(sig.ext, start, end) for sig, start, end in hits] == [('png', 14, len(data))]
+
+class CountingBytes(bytes):
+    """Counts the bytes covered by footer searches."""
+    searched = 0
+
+    def find(self, sub, start=None, end=None):
+        if sub == b'PK\x05\x06':
+            CountingBytes.searched += len(self[start:end])
+        return super().find(sub, start, end)
+
+def test_scan_truncated_zip_searches_once():
+    # Many local file headers and no End Of Central Directory: each failed
+    # search must not rescan the region the previous one already covered
+    member = b'PK\x03\x04' + b'\x00' * 996
+    complete = b'PK\x03\x04' + b'\x00' * 26 + b'PK\x05\x06' + b'\x00' * 16 + b'\x00\x00'
+    data = CountingBytes(member * 2000 + complete)
+
+    zip_sig = SIGNATURES['zip']._replace(max_size=500 * 1000)
+    CountingBytes.searched = 0
+    hits = list(_scan(data, [zip_sig]))
+
+    # The first header within max_size of the EOCD starts the only carved archive
+    eocd = len(data) - 22
+    first = next(offset for offset in range(0, len(data), 1000) if offset + zip_sig.max_size >= eocd + 22)
+    assert [(start, end) for _, start, end in hits] == [(first, len(data))]
+    assert CountingBytes.searched < 2 * len(data)
+
+def test_carve_files_parallel_matches_sequential(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    fake_png = b'\x89PNG\r\n\x1a\n\x00\x00\x00\x00IEND\xae\x42\x60\x82'
+    # The first JPG spans the seam at offset 64 and embeds a JPG just after it
+    spanning_jpg = make_jpeg(comment=b'\x00' * 60 + make_jpeg())
+    with open(bin_path, 'wb') as f:
+        f.write(b'j')
+        f.write(spanning_jpg)
+        for i in range(20):
+            f.write(b'junk' * i + fake_png + make_jpeg(scan=bytes([i]) * 20))
+
+    sequential = carve_files(str(bin_path), str(tmp_path / "seq"))
+    parallel = carve_files(str(bin_path), str(tmp_path / "par"), workers=2, segment_size=64)
+
+    assert parallel == sequential
+    assert sequential['jpg'] == 21
+    assert (tmp_path / "par" / "recovered_0.jpg").read_bytes() == spanning_jpg
+    assert sorted(os.listdir(tmp_path / "par")) == sorted(os.listdir(tmp_path / "seq"))
+    for name in os.listdir(tmp_path / "seq"):
+        assert (tmp_path / "par" / name).read_bytes() == (tmp_path / "seq" / name).read_bytes()
+
+def make_overlapping_jpeg(pad):
+    # A JPEG whose comment holds a bogus SOI + COM whose length jumps to the
+    # COM marker of the JPEG written right after it: a scan starting inside
+    # the comment carves a file running past this one's end
+    comment_len = pad + 6
+    outer_len = len(make_jpeg(comment=b'\x00' * comment_len))
+    jump = outer_len + 2 - (6 + pad + 4)
+    return make_jpeg(comment=b'\x00' * pad + b'\xFF\xD8\xFF\xFE' + struct.pack('>H', jump))
+
+def test_carve_files_parallel_rescans_only_carried_gap(tmp_path, monkeypatch):
+    bin_path = tmp_path / "dense.bin"
+    with open(bin_path, 'wb') as f:
+        for i in range(100):
+            f.write(make_overlapping_jpeg(pad=400))
+            f.write(make_jpeg(comment=b'\x00' * 300, scan=bytes([i + 1]) * 10))
+    size = os.path.getsize(bin_path)
+
+    parent = os.getpid()
+    rescanned = []
+    scan = file_carver._scan
+
+    def counting_scan(data, signatures, start=0, stop=None, *args, **kwargs):
+        if os.getpid() == parent:
+            rescanned.append((stop or len(data)) - start)
+        return scan(data, signatures, start, stop, *args, **kwargs)
+
+    monkeypatch.setattr(file_carver, "_scan", counting_scan)
+    sequential = carve_files(str(bin_path), str(tmp_path / "seq"), types=['jpg'], index_only=True)
+    parallel = carve_files(str(bin_path), str(tmp_path / "par"), types=['jpg'], workers=4,
+                           segment_size=777, index_only=True)
+
+    assert parallel == sequential == {'jpg': 200}
+    assert (list(read_manifest(str(tmp_path / "par" / MANIFEST_NAME)))
+            == list(read_manifest(str(tmp_path / "seq" / MANIFEST_NAME))))
+    # Seams inside a bogus comment make the parent rescan up to the end of
+    # the worker's bogus hit, not the rest of the segment
+    assert rescanned
+    assert max(rescanned) <= len(make_jpeg(comment=b'\x00' * 300, scan=b'\x01' * 10))
+
+def test_carve_files_index_only_and_extract(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    output_dir = tmp_path / "index"
+    fake_jpg = make_jpeg()
+    fake_gif = b'GIF89a\x01\x00\x01\x00\x00\x3B'
+    bin_path.write_bytes(b'junk' + fake_jpg + b'junk' + fake_gif)
+
+    counts = carve_files(str(bin_path), str(output_dir), index_only=True)
+
+    assert counts['jpg'] == 1
+    assert counts['gif'] == 1
+    assert os.listdir(output_dir) == [MANIFEST_NAME]
+
+    records = list(read_manifest(str(output_dir / MANIFEST_NAME)))
+    assert [(r['type'], r['offset'], r['length']) for r in records] == [
+        ('jpg', 4, len(fake_jpg)),
+        ('gif', 8 + len(fake_jpg), len(fake_gif)),
+    ]
+
+    extracted = extract_carved(str(bin_path), str(output_dir / MANIFEST_NAME),
+                               str(tmp_path / "out"), types=['gif'])
+    assert extracted == 1
+    assert (tmp_path / "out" / f"offset_{8 + len(fake_jpg)}.gif").read_bytes() == fake_gif
+
+def test_carve_files_dedupe(tmp_path):
+    bin_path = tmp_path / "dump.bin"
+    output_dir = tmp_path / "recovered"
+    icon = make_jpeg(scan=b'\x11' * 32)
+    photo = make_jpeg(scan=b'\x22' * 32)
+    bin_path.write_bytes(icon + b'junk' + icon + b'junk' + photo + icon)
+
+    counts = carve_files(str(bin_path), str(output_dir), dedupe=True)
+
+    assert counts['jpg'] == 4
+    records = list(read_manifest(str(output_dir / MANIFEST_NAME)))
+    assert len(records) == 4
+    assert len({r['sha256'] for r in records}) == 2
+    assert records[0]['path'] == records[1]['path'] == records[3]['path']
+
+    objects = [os.path.join(root, name) for root, _, names in os.walk(output_dir / OBJECTS_DIR) for name in names]
+    assert len(objects) == 2
+    assert (output_dir / records[2]['path']).read_bytes() == photo
+
+def test_carve_files_resumes_from_checkpoint(tmp_path, monkeypatch):
+    bin_path = tmp_path / "dump.bin"
+    window = 4 * 1024 * 1024
+    # Two JPGs in each of three scan windows
+    with open(bin_path, 'wb') as f:
+        for i in range(3):
+            block = make_jpeg(scan=bytes([i + 1]) * 16) + b'junk' + make_jpeg(scan=bytes([i + 10]) * 16)
+            f.write(block + b'\x00' * (window - len(block)))
+
+    clean = carve_files(str(bin_path), str(tmp_path / "clean"), dedupe=True)
+
+    # Crash while emitting the first hit of the last window
+    emitted = []
+    original_emit = file_carver._CarveOutput.emit
+    def crashing_emit(self, sig, start, payload):
+        if start >= 2 * window:
+            raise RuntimeError("pre-empted")
+        emitted.append(start)
+        original_emit(self, sig, start, payload)
+    monkeypatch.setattr(file_carver._CarveOutput, 'emit', crashing_emit)
+
+    output_dir = tmp_path / "resumed"
+    assert carve_files(str(bin_path), str(output_dir), dedupe=True, checkpoint_interval=1) is None
+    assert (output_dir / CHECKPOINT_NAME).exists()
+    assert len(emitted) == 4
+
+    # The rerun only emits hits after the checkpoint
+    emitted.clear()
+    monkeypatch.setattr(file_carver._CarveOutput, 'emit', lambda self, sig, start, payload: (
+        emitted.append(start), original_emit(self, sig, start, payload)))
+    resumed = carve_files(str(bin_path), str(output_dir), dedupe=True, checkpoint_interval=1)
+
+    assert resumed == clean
+    assert len(emitted) == 2 and min(emitted) >= 2 * window
+    assert not (output_dir / CHECKPOINT_NAME).exists()
+    assert (output_dir / MANIFEST_NAME).read_text() == (tmp_path / "clean" / MANIFEST_NAME).read_text()
+
+def test_carve_files_restarts_when_manifest_lost(tmp_path, monkeypatch):
+    bin_path = tmp_path / "dump.bin"
+    window = 4 * 1024 * 1024
+    with open(bin_path, 'wb') as f:
+        for i in range(2):
+            block = make_jpeg(scan=bytes([i + 1]) * 16)
+            f.write(block + b'\x00' * (window - len(block)))
+
+    clean = carve_files(str(bin_path), str(tmp_path / "clean"), index_only=True)
+
+    original_emit = file_carver._CarveOutput.emit
+    def crashing_emit(self, sig, start, payload):
+        if start >= window:
+            raise RuntimeError("pre-empted")
+        original_emit(self, sig, start, payload)
+    monkeypatch.setattr(file_carver._CarveOutput, 'emit', crashing_emit)
+
+    output_dir = tmp_path / "resumed"
+    assert carve_files(str(bin_path), str(output_dir), index_only=True, checkpoint_interval=1) is None
+    assert (output_dir / CHECKPOINT_NAME).exists()
+
+    # The checkpoint is discarded rather than padding a missing manifest with NULs
+    (output_dir / MANIFEST_NAME).unlink()
+    monkeypatch.setattr(file_carver._CarveOutput, 'emit', original_emit)
+    assert carve_files(str(bin_path), str(output_dir), index_only=True, checkpoint_interval=1) == clean
+    assert (output_dir / MANIFEST_NAME).read_text() == (tmp_path / "clean" / MANIFEST_NAME).read_text()
@@ -1,7 +1,10 @@
 import pytest
-from dft.modules.exif_extractor import extract_exif
+from dft.modules import exif_extractor
+from dft.modules.exif_extractor import extract_exif, extract_exif_batch, exif_to_dataframe, gps_coordinates
 from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
 import os
+import struct
 
 def test_extract_exif_no_data(tmp_path):
     # Create a dummy image without EXIF
@@ -17,3 +20,117 @@ def test_extract_exif_no_data(tmp_path):
 def test_extract_exif_file_not_found():
     exif_data = extract_exif("non_existent_image.jpg")
     assert exif_data is None
+
+def make_photo(path, make="Canon", model="EOS 5D", fmt="JPEG"):
+    image = Image.new('RGB', (32, 32), color='blue')
+    exif = Image.Exif()
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif[0x0132] = "2023:11:28 21:01:40"
+    image.save(path, format=fmt, exif=exif)
+
+def test_extract_exif_batch(tmp_path):
+    library = tmp_path / "library"
+    (library / "2023" / "trip").mkdir(parents=True)
+    for i in range(20):
+        make_photo(library / "2023" / "trip" / f"IMG_{i:04d}.JPG", model=f"Model {i % 3}")
+    make_photo(library / "2023" / "renamed.bin")
+    make_photo(library / "scan.tiff", fmt="TIFF")
+    (library / "notes.txt").write_text("not a photo")
+    (library / "broken.jpg").write_text("not a photo either")
+
+    results = dict(extract_exif_batch(str(library), workers=2, chunk_size=4))
+    assert len(results) == 22
+    assert results[str(library / "broken.jpg")] is None
+    assert results[str(library / "2023" / "trip" / "IMG_0004.JPG")]['Model'] == "Model 1"
+    assert results[str(library / "scan.tiff")]['Make'] == "Canon"
+
+    by_magic = dict(extract_exif_batch(str(library), workers=2, match='magic'))
+    assert str(library / "2023" / "renamed.bin") in by_magic
+    assert str(library / "notes.txt") not in by_magic
+    assert str(library / "broken.jpg") not in by_magic
+    assert len(by_magic) == 22
+
+    df = exif_to_dataframe(by_magic.items())
+    assert len(df) == 22
+    assert set(df['Make']) == {"Canon"}
+
+def make_gps_exif():
+    exif = Image.Exif()
+    exif[0x010F] = "Canon"
+    exif.get_ifd(0x8769)[0x829A] = IFDRational(1, 250)
+    exif.get_ifd(0x8769)[0x927C] = b"\x00\x01maker"
+    gps = exif.get_ifd(0x8825)
+    gps[1] = "N"
+    gps[2] = (IFDRational(51), IFDRational(30), IFDRational(1234, 100))
+    gps[3] = "W"
+    gps[4] = (IFDRational(0), IFDRational(7), IFDRational(3963, 100))
+    return exif
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP", "TIFF"])
+def test_header_parser_matches_pillow(tmp_path, fmt):
+    path = tmp_path / f"photo.{fmt.lower()}"
+    Image.new('RGB', (32, 32)).save(path, format=fmt, exif=make_gps_exif())
+
+    fast = extract_exif(str(path))
+    assert fast == extract_exif(str(path), fast=False)
+    assert fast['Make'] == "Canon"
+    if fmt != "TIFF":
+        # Pillow's TIFF writer only keeps IFD0
+        assert fast['ExposureTime'] == 0.004
+        assert fast['GPSInfo']['GPSLatitudeRef'] == "N"
+        lat, lon = gps_coordinates(fast)
+        assert lat == pytest.approx(51.503428)
+        assert lon == pytest.approx(-0.127675)
+
+def test_header_parser_reads_only_the_header(tmp_path, monkeypatch):
+    path = tmp_path / "large.jpg"
+    Image.frombytes('RGB', (1024, 1024), os.urandom(1024 * 1024 * 3)).save(path, exif=make_gps_exif())
+    assert os.path.getsize(path) > 100 * exif_extractor.HEADER_READ
+
+    reads = []
+
+    class CountingFile:
+        def __init__(self, f):
+            self.f = f
+
+        def read(self, size=-1):
+            data = self.f.read(size)
+            reads.append(len(data))
+            return data
+
+        def __getattr__(self, name):
+            return getattr(self.f, name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+    monkeypatch.setattr(exif_extractor, 'open', lambda *args: CountingFile(open(*args)), raising=False)
+    exif = extract_exif(str(path))
+    assert gps_coordinates(exif) == pytest.approx((51.503428, -0.127675))
+    assert reads == [exif_extractor.HEADER_READ]
+
+def box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+def test_header_parser_heif(tmp_path):
+    # Minimal HEIF: meta box with an Exif item whose iloc extent points into mdat
+    payload = b"\x00\x00\x00\x06" + make_gps_exif().tobytes()
+    ftyp = box(b'ftyp', b'heic\x00\x00\x00\x00mif1heic')
+    infe = box(b'infe', b'\x02\x00\x00\x00' + struct.pack('>HH', 1, 0) + b'Exif')
+    iinf = box(b'iinf', b'\x00\x00\x00\x00' + struct.pack('>H', 1) + infe)
+
+    def meta(offset):
+        iloc = box(b'iloc', b'\x00\x00\x00\x00\x44\x00' + struct.pack('>HHHHII', 1, 1, 0, 1, offset, len(payload)))
+        return box(b'meta', b'\x00\x00\x00\x00' + iinf + iloc)
+
+    data_offset = len(ftyp) + len(meta(0)) + 8
+    path = tmp_path / "photo.heic"
+    path.write_bytes(ftyp + meta(data_offset) + box(b'mdat', payload))
+
+    exif = extract_exif(str(path))
+    assert exif['Make'] == "Canon"
+    assert gps_coordinates(exif) == pytest.approx((51.503428, -0.127675))
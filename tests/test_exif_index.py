@@ -0,0 +1,109 @@
+import os
+import pytest
+from datetime import datetime
+from dft.modules.exif_index import ExifIndex
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+def dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600 * 100)
+    return (IFDRational(degrees), IFDRational(minutes), IFDRational(seconds, 100))
+
+def make_photo(path, make, model, taken, position=None):
+    exif = Image.Exif()
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif.get_ifd(0x8769)[0x9003] = taken
+    if position:
+        gps = exif.get_ifd(0x8825)
+        gps[1] = "N" if position[0] >= 0 else "S"
+        gps[2] = dms(position[0])
+        gps[3] = "E" if position[1] >= 0 else "W"
+        gps[4] = dms(position[1])
+    Image.new('RGB', (16, 16)).save(path, format="JPEG", exif=exif)
+
+def make_library(library):
+    library.mkdir()
+    make_photo(library / "london1.jpg", "Canon", "EOS 5D", "2023:06:01 10:00:00", (51.5007, -0.1246))
+    make_photo(library / "london2.jpg", "Canon ", "EOS R5", "2023:06:02 11:00:00", (51.5081, -0.0759))
+    make_photo(library / "paris.jpg", "Apple", "iPhone 14", "2023:07:14 12:00:00", (48.8584, 2.2945))
+    make_photo(library / "fiji.jpg", "Apple", "iPhone 14", "2023:08:01 09:00:00", (-17.7134, 178.0650))
+    make_photo(library / "nogps.jpg", "canon", "EOS 5D", "2024:01:01 00:00:00")
+    Image.new('RGB', (16, 16)).save(library / "plain.jpg")
+
+def test_exif_index_queries(tmp_path):
+    library = tmp_path / "library"
+    make_library(library)
+
+    with ExifIndex(str(tmp_path / "exif.db")) as index:
+        assert index.update(str(library), workers=2) == 6
+        assert len(index) == 6
+
+        canon = index.query(make="CANON")
+        assert [os.path.basename(row['path']) for row in canon] == ["london1.jpg", "london2.jpg", "nogps.jpg"]
+        assert canon[1]['make'] == "Canon"
+
+        london = index.query(bbox=(51.4, -0.3, 51.6, 0.1))
+        assert {os.path.basename(row['path']) for row in london} == {"london1.jpg", "london2.jpg"}
+        assert london[0]['latitude'] == pytest.approx(51.5007, abs=1e-4)
+
+        both = index.query(make="canon", model="eos 5d", bbox=(51.4, -0.3, 51.6, 0.1),
+                           start=datetime(2023, 5, 1), end="2023-06-01")
+        assert [os.path.basename(row['path']) for row in both] == ["london1.jpg"]
+
+        # A box across the antimeridian
+        pacific = index.query(bbox=(-20, 170, -10, -170))
+        assert [os.path.basename(row['path']) for row in pacific] == ["fiji.jpg"]
+
+        df = index.query(start="2023-07-01", as_dataframe=True)
+        assert list(df['model']) == ["iPhone 14", "iPhone 14", "EOS 5D"]
+        assert df['taken'].iloc[0] == datetime(2023, 7, 14, 12)
+
+        assert index.get(str(library / "paris.jpg"))['Model'] == "iPhone 14"
+        assert index.get(str(library / "plain.jpg")) == {}
+
+def test_exif_index_incremental(tmp_path):
+    library = tmp_path / "library"
+    make_library(library)
+    db_path = str(tmp_path / "exif.db")
+
+    with ExifIndex(db_path) as index:
+        assert index.update(str(library), workers=2) == 6
+
+    # Reopened: nothing changed, so nothing is re-extracted
+    with ExifIndex(db_path) as index:
+        assert index.update(str(library), workers=2) == 0
+
+        make_photo(library / "paris.jpg", "Nikon", "Z6", "2023:07:15 12:00:00")
+        os.utime(library / "paris.jpg", ns=(1, 1))
+        (library / "london2.jpg").unlink()
+        assert index.update(str(library), workers=2) == 1
+        assert index.prune() == 1
+
+        assert len(index) == 5
+        assert [row['model'] for row in index.query(make="Nikon")] == ["Z6"]
+        # The rewritten photo lost its GPS position, and its R*Tree entry with it
+        assert index.query(bbox=(48, 2, 49, 3)) == []
+
+def test_exif_index_remembers_rejected_files(tmp_path):
+    library = tmp_path / "library"
+    make_library(library)
+    (library / "notes.txt").write_text("not a photo")
+    photo = str(library / "paris.jpg")
+
+    with ExifIndex(str(tmp_path / "exif.db")) as index:
+        assert index.update(str(library), workers=2, match='magic') == 6
+        assert index.is_current(str(library / "notes.txt"))
+        assert index.get(str(library / "notes.txt")) is None
+        # Rejected files are not sniffed again while unchanged
+        assert index.update(str(library), workers=2, match='magic') == 0
+
+        (library / "notes.txt").unlink()
+        assert index.prune() == 1
+        # A changed path listed twice is indexed twice rather than failing
+        os.utime(photo, ns=(1, 1))
+        assert index.update([photo, photo], workers=1) == 2
+        assert len(index) == 6
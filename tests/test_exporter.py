@@ -0,0 +1,43 @@
+import pytest
+import pandas as pd
+from dft.utils.exporter import export_table, detect_format
+
+def test_export_table_chunked_csv(tmp_path):
+    batches = (pd.DataFrame({'n': range(start, start + 10), 'label': [f"row{i}" for i in range(start, start + 10)]})
+               for start in range(0, 30, 10))
+
+    csv_path = tmp_path / "rows.csv.gz"
+    assert detect_format(csv_path) == 'csv'
+    assert export_table(batches, str(csv_path), chunk_rows=4) == 30
+
+    df = pd.read_csv(csv_path)
+    assert list(df.columns) == ['n', 'label']
+    assert df['n'].tolist() == list(range(30))
+
+    records = [{'a': i, 'b': None} for i in range(5)]
+    assert export_table(records, str(tmp_path / "records.csv"), chunk_rows=2) == 5
+    assert pd.read_csv(tmp_path / "records.csv")['a'].tolist() == list(range(5))
+    assert export_table(records, str(tmp_path / "records.xyz"), fmt='xlsx') is None
+
+def test_export_table_empty_stream(tmp_path):
+    for name in ("empty.csv", "empty.csv.gz"):
+        path = tmp_path / name
+        assert export_table(iter([]), str(path)) == 0
+        assert not path.exists()
+
+def test_export_table_columnar(tmp_path):
+    pytest.importorskip("pyarrow")
+    chunks = [
+        pd.DataFrame({'port': pd.array([80, None], dtype='UInt16'), 'title': [None, None],
+                      'src': pd.Categorical(["10.0.0.1", "10.0.0.2"])}),
+        pd.DataFrame({'port': pd.array([443], dtype='UInt16'), 'title': ["text"],
+                      'src': pd.Categorical(["10.0.0.1"], categories=["10.0.0.1", "10.0.0.2"])}),
+    ]
+    for name, reader in (("rows.parquet", pd.read_parquet), ("rows.feather", pd.read_feather)):
+        path = str(tmp_path / name)
+        assert export_table(iter(chunks), path) == 3
+        df = reader(path)
+        assert str(df['port'].dtype) == 'UInt16'
+        assert df['port'].tolist()[1] is pd.NA
+        assert df['title'].tolist()[2] == "text"
+        assert df['src'].astype(str).tolist() == ["10.0.0.1", "10.0.0.2", "10.0.0.1"]
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from dft.utils.files import bounded_map, iter_files
+
+def test_iter_files(tmp_path):
+    (tmp_path / "b" / "nested").mkdir(parents=True)
+    (tmp_path / "a").mkdir()
+    for name in ("b/nested/x.pcap", "b/y.txt", "a/z.pcap", "top.pcap1"):
+        (tmp_path / name).write_text("data")
+    listed = tmp_path / "b" / "y.txt"
+
+    found = list(iter_files([str(tmp_path), str(listed)], lambda name: ".pcap" in name))
+    assert found == [str(tmp_path / "top.pcap1"), str(tmp_path / "a" / "z.pcap"),
+                     str(tmp_path / "b" / "nested" / "x.pcap"), str(listed)]
+    assert len(list(iter_files(str(tmp_path)))) == 4
+
+def test_bounded_map_limits_in_flight():
+    pulled = []
+
+    def items():
+        for i in range(50):
+            pulled.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = bounded_map(pool, lambda i: i * i, items(), 3)
+        first = next(results)
+        # Nothing past the in-flight limit is pulled before a result is taken
+        assert len(pulled) == 3
+        assert dict([first, *results]) == {i: i * i for i in range(50)}
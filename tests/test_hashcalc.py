@@ -1,6 +1,9 @@
 import pytest
 import os
-from dft.modules.hashcalc import calculate_hashes
+import hashlib
+from dft.modules import hashcalc
+from dft.modules.hashcalc import (calculate_hashes, hash_files, HashCache, PARALLEL_THRESHOLD,
+                                  calculate_piecewise_hashes, verify_piecewise, update_piecewise)
 
 def test_calculate_hashes(tmp_path):
     # Create a temporary file
@@ -24,3 +27,120 @@ def test_calculate_hashes(tmp_path):
 def test_calculate_hashes_file_not_found():
     hashes = calculate_hashes("non_existent_file.txt")
     assert hashes is None
+
+def test_hash_files_directory(tmp_path):
+    (tmp_path / "a.txt").write_text("Hello World")
+    nested = tmp_path / "nested" / "deeper"
+    nested.mkdir(parents=True)
+    for i in range(10):
+        (nested / f"file_{i}.bin").write_bytes(bytes([i]) * (i * 1000))
+    (tmp_path / "nested" / "b.txt").write_text("other")
+
+    results = dict(hash_files([str(tmp_path)], workers=3))
+
+    assert len(results) == 12
+    assert results[str(tmp_path / "a.txt")]['sha256'] == "a591a6d40bf420404a011733cfb7b190d62c65bf0bcda32b57b277d9ad9f146e"
+    for path, hashes in results.items():
+        assert hashes == calculate_hashes(path)
+
+def test_hash_files_missing_file():
+    results = list(hash_files(["non_existent_file.txt"]))
+    assert results == [("non_existent_file.txt", None)]
+
+def test_calculate_hashes_selected_algorithms(tmp_path):
+    p = tmp_path / "hello.txt"
+    p.write_text("Hello World")
+
+    hashes = calculate_hashes(str(p), algorithms=('sha256', 'blake2b'))
+
+    assert set(hashes) == {'sha256', 'blake2b'}
+    assert hashes['sha256'] == "a591a6d40bf420404a011733cfb7b190d62c65bf0bcda32b57b277d9ad9f146e"
+    assert hashes['blake2b'] == hashlib.blake2b(b"Hello World").hexdigest()
+
+def test_calculate_hashes_large_file_parallel_updates(tmp_path):
+    # Large enough to take the threaded update path, and not a multiple of the read size
+    data = os.urandom(PARALLEL_THRESHOLD + 12345)
+    p = tmp_path / "large.bin"
+    p.write_bytes(data)
+
+    hashes = calculate_hashes(str(p), algorithms=('md5', 'sha1', 'sha512'))
+
+    assert hashes['md5'] == hashlib.md5(data).hexdigest()
+    assert hashes['sha1'] == hashlib.sha1(data).hexdigest()
+    assert hashes['sha512'] == hashlib.sha512(data).hexdigest()
+
+def test_calculate_hashes_unsupported_algorithm(tmp_path):
+    p = tmp_path / "hello.txt"
+    p.write_text("Hello World")
+    assert calculate_hashes(str(p), algorithms=('not-a-hash',)) is None
+
+def test_calculate_hashes_cache(tmp_path, monkeypatch):
+    p = tmp_path / "hello.txt"
+    p.write_text("Hello World")
+
+    with HashCache(str(tmp_path / "cache.db")) as cache:
+        first = calculate_hashes(str(p), cache=cache)
+
+        # A cache hit must not read the file
+        monkeypatch.setattr(hashcalc, '_hash_serial', lambda f, hashes: pytest.fail("file was rehashed"))
+        assert calculate_hashes(str(p), cache=cache) == first
+        monkeypatch.undo()
+
+        # Changing the file changes its identity
+        p.write_text("Hello World!")
+        os.utime(p, ns=(0, 12345))
+        assert calculate_hashes(str(p), cache=cache)['sha256'] == hashlib.sha256(b"Hello World!").hexdigest()
+
+        # Verify mode rehashes and flags a stale cached digest
+        identity = HashCache.identity(str(p))
+        cache.put(identity, str(p), {'md5': '0' * 32, 'sha1': '0' * 40, 'sha256': '0' * 64})
+        verified = calculate_hashes(str(p), cache=cache, verify=True)
+        assert verified['md5'] == hashlib.md5(b"Hello World!").hexdigest()
+        assert cache.get(identity, ('md5',)) == {'md5': verified['md5']}
+
+        cache.invalidate(str(p))
+        assert cache.get(identity, ('md5',)) is None
+
+def test_hash_cache_eviction(tmp_path):
+    with HashCache(str(tmp_path / "cache.db"), max_entries=3) as cache:
+        for i in range(5):
+            cache.put((1, i, 10, 0), f"file_{i}", {'sha256': str(i)})
+        cache.evict()
+        assert cache.get((1, 0, 10, 0), ('sha256',)) is None
+        assert cache.get((1, 4, 10, 0), ('sha256',)) == {'sha256': '4'}
+
+def test_piecewise_hashes_and_merkle_root(tmp_path):
+    block_size = 4096
+    data = os.urandom(block_size * 2 + 100)
+    p = tmp_path / "image.dd"
+    p.write_bytes(data)
+
+    result = calculate_piecewise_hashes(str(p), block_size=block_size, workers=2)
+
+    blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    assert result['blocks'] == [hashlib.sha256(b).hexdigest() for b in blocks]
+    digests = [hashlib.sha256(b).digest() for b in blocks]
+    # Three leaves: the first two are paired, the third is promoted
+    expected_root = hashlib.sha256(hashlib.sha256(digests[0] + digests[1]).digest() + digests[2]).hexdigest()
+    assert result['merkle_root'] == expected_root
+
+def test_piecewise_verify_and_update(tmp_path):
+    block_size = 4096
+    data = bytearray(os.urandom(block_size * 8))
+    original = tmp_path / "image.dd"
+    original.write_bytes(data)
+    reference = calculate_piecewise_hashes(str(original), block_size=block_size)
+
+    assert verify_piecewise(str(original), reference) == []
+
+    data[block_size * 5 + 10] ^= 0xFF
+    data[block_size * 6 + 10] ^= 0xFF
+    copy = tmp_path / "copy.dd"
+    copy.write_bytes(data)
+
+    assert verify_piecewise(str(copy), reference) == [5]
+    assert verify_piecewise(str(copy), reference, stop_at_first=False) == [5, 6]
+
+    updated = update_piecewise(str(copy), reference, [(block_size * 5 + 10, block_size * 6 + 11)])
+    assert updated == calculate_piecewise_hashes(str(copy), block_size=block_size)
+    assert updated['merkle_root'] != reference['merkle_root']
@@ -0,0 +1,39 @@
+import pytest
+import hashlib
+from dft.modules.known_hashes import build_known_index, KnownHashIndex
+from dft.modules.hashcalc import hash_files
+
+def test_build_and_query_known_index(tmp_path):
+    known = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(1000)]
+    list_path = tmp_path / "NSRLFile.txt"
+    with open(list_path, 'w') as f:
+        f.write('"SHA-1","MD5","CRC32","FileName"\n')
+        for digest in known + known[:10]:
+            f.write(f'"{digest.upper()}","{"0" * 32}","00000000","file.dll"\n')
+
+    # A small chunk forces the external merge path
+    count = build_known_index(str(list_path), str(tmp_path / "known.idx"), chunk=128)
+    assert count == 1000
+
+    with KnownHashIndex(str(tmp_path / "known.idx")) as index:
+        assert index.algorithm == 'sha1'
+        assert len(index) == 1000
+        assert all(digest in index for digest in known)
+        assert hashlib.sha1(b"unknown").hexdigest() not in index
+
+def test_hash_files_tags_known_files(tmp_path):
+    files = tmp_path / "files"
+    files.mkdir()
+    (files / "os.dll").write_bytes(b"known system file")
+    (files / "evil.exe").write_bytes(b"something new")
+
+    list_path = tmp_path / "known.txt"
+    list_path.write_text(hashlib.sha256(b"known system file").hexdigest() + "\n")
+    build_known_index(str(list_path), str(tmp_path / "known.idx"), algorithm='sha256', bloom_bits_per_entry=0)
+
+    with KnownHashIndex(str(tmp_path / "known.idx")) as index:
+        results = dict(hash_files(str(files), algorithms=('md5',), known_index=index))
+
+    assert results[str(files / "os.dll")]['known'] is True
+    assert results[str(files / "evil.exe")]['known'] is False
+    assert 'sha256' in results[str(files / "evil.exe")]
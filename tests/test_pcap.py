@@ -1,6 +1,12 @@
+import json
+import os
 import pytest
-from dft.modules.pcap_analyzer import analyze_pcap
-from scapy.all import wrpcap, Ether, IP, TCP
+import pandas as pd
+from dft.modules import pcap_analyzer
+from dft.modules.pcap_analyzer import (analyze_pcap, analyze_pcaps, export_pcap, export_pcap_csv,
+                                        export_flows_csv)
+from scapy.all import (wrpcap, wrpcapng, Ether, Dot1Q, IP, IPv6, TCP, UDP, CookedLinux,
+                       RadioTap, Dot11, LLC, SNAP, IPv6ExtHdrHopByHop, IPv6ExtHdrDestOpt, IPv6ExtHdrRouting)
 
 def test_analyze_pcap(tmp_path):
     # Create a dummy PCAP file
@@ -22,3 +28,255 @@ def test_analyze_pcap(tmp_path):
 def test_analyze_pcap_file_not_found():
     stats = analyze_pcap("non_existent.pcap")
     assert stats is None
+
+def test_analyze_pcap_streaming_pcapng(tmp_path):
+    pcap_file = tmp_path / "test.pcapng"
+    packets = [Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/TCP(sport=1234, dport=443) for _ in range(5)]
+    packets += [Ether()/IP(src="10.0.0.3", dst="10.0.0.1")/UDP(sport=5353, dport=53) for _ in range(3)]
+    wrpcapng(str(pcap_file), packets)
+
+    stats = analyze_pcap(str(pcap_file), include_packets=False)
+
+    assert stats['packet_count'] == 8
+    assert stats['src_ips']["10.0.0.1"] == 5
+    assert stats['dst_ips']["10.0.0.1"] == 3
+    assert stats['top_ports'][443] == 5
+    assert stats['top_ports'][53] == 3
+    assert stats['protocols'] == {'TCP': 5, 'UDP': 3}
+    assert len(stats['dataframe_data']) == 0
+
+def test_analyze_pcap_fast_path_matches_scapy(tmp_path):
+    packets = [
+        Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/TCP(sport=1234, dport=443),
+        Ether()/Dot1Q(vlan=7)/IP(src="10.0.0.3", dst="10.0.0.1")/UDP(sport=5353, dport=53),
+        Ether()/IPv6(src="fe80::1", dst="2001:db8::2")/TCP(sport=2222, dport=22),
+        Ether()/IP(src="10.0.0.1", dst="10.0.0.2", frag=10)/TCP(dport=80),
+        Ether(type=0x0806)/b"arp",
+        Ether()/IPv6(src="fe80::1", dst="ff02::16")/IPv6ExtHdrHopByHop()/UDP(sport=546, dport=547),
+        Ether()/IPv6(src="fe80::1", dst="2001:db8::2")/IPv6ExtHdrDestOpt()/IPv6ExtHdrRouting()/TCP(dport=22),
+    ]
+    for i, pkt in enumerate(packets):
+        pkt.time = 1700000000 + i * 0.25
+    for name, writer in (("test.pcap", wrpcap), ("test.pcapng", wrpcapng)):
+        pcap_file = str(tmp_path / name)
+        writer(pcap_file, packets)
+
+        fast = analyze_pcap(pcap_file)
+        slow = analyze_pcap(pcap_file, fast=False)
+
+        assert fast['packet_count'] == slow['packet_count'] == 7
+        for key in ('src_ips', 'dst_ips', 'top_ports', 'protocols'):
+            assert fast[key] == slow[key]
+        assert fast['src_ips']["fe80::1"] == 3
+        assert fast['top_ports'][53] == 1
+        assert fast['dataframe_data']['proto'].tolist()[5:] == [17, 6]
+        pd.testing.assert_frame_equal(fast['dataframe_data'], slow['dataframe_data'])
+        pd.testing.assert_frame_equal(fast['flows'].to_dataframe(), slow['flows'].to_dataframe())
+
+    cooked = str(tmp_path / "cooked.pcap")
+    wrpcap(cooked, [CookedLinux()/IP(src="10.1.1.1", dst="10.1.1.2")/UDP(dport=123)])
+    assert analyze_pcap(cooked)['top_ports'][123] == 1
+
+    # Link types the raw parser does not know are dissected by scapy
+    wireless = str(tmp_path / "wireless.pcap")
+    wrpcap(wireless, [RadioTap()/Dot11(type=2)/LLC()/SNAP()/IP(src="10.2.2.2", dst="10.2.2.3")/UDP(dport=67)])
+    stats = analyze_pcap(wireless)
+    assert stats['src_ips']["10.2.2.2"] == 1
+    assert stats['top_ports'][67] == 1
+
+def test_analyze_pcap_packet_table(tmp_path):
+    pcap_file = str(tmp_path / "test.pcap")
+    packets = [Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/TCP(sport=1234, dport=443) for _ in range(4)]
+    packets += [Ether()/IPv6(src="::1", dst="::2")/UDP(sport=5353, dport=53)]
+    packets += [Ether(type=0x0806)/b"arp"]
+    wrpcap(pcap_file, packets)
+
+    stats = analyze_pcap(pcap_file)
+    table = stats['packets']
+    assert len(table) == stats['packet_count'] == 6
+    assert table.addresses == ["10.0.0.1", "10.0.0.2", "::1", "::2"]
+    assert list(table.columns()['src']) == [0, 0, 0, 0, 2, -1]
+    assert stats['src_ips'] == {"10.0.0.1": 4, "::1": 1}
+    assert stats['top_ports'] == {443: 4, 53: 1}
+    assert stats['protocols'] == {'TCP': 4, 'UDP': 1}
+
+    df = stats['dataframe_data']
+    assert list(df.columns) == ['time', 'src', 'dst', 'proto', 'sport', 'dport']
+    assert df['dport'].tolist()[-2:] == [53, pd.NA]
+    assert pd.isna(df['src'].iloc[-1])
+
+    csv_path = tmp_path / "packets.csv"
+    assert export_pcap_csv(stats, str(csv_path))
+    exported = pd.read_csv(csv_path)
+    assert exported['dport'].tolist()[:5] == [443, 443, 443, 443, 53]
+
+    chunked_path = tmp_path / "packets_chunked.csv"
+    assert export_pcap(stats, str(chunked_path), chunk_rows=4)
+    pd.testing.assert_frame_equal(pd.read_csv(chunked_path), exported)
+
+def test_analyze_pcap_flows(tmp_path):
+    pcap_file = str(tmp_path / "flows.pcap")
+    client, server = "10.0.0.1", "10.0.0.2"
+    packets = [
+        Ether()/IP(src=client, dst=server)/TCP(sport=40000, dport=80, flags="S"),
+        Ether()/IP(src=server, dst=client)/TCP(sport=80, dport=40000, flags="SA"),
+        Ether()/IP(src=client, dst=server)/TCP(sport=40000, dport=80, flags="A")/(b"x" * 100),
+        Ether()/IP(src=client, dst="10.0.0.53")/UDP(sport=5353, dport=53),
+        # Same 5-tuple after the idle timeout starts a new flow
+        Ether()/IP(src=client, dst=server)/TCP(sport=40000, dport=80, flags="F"),
+    ]
+    for pkt, t in zip(packets, (0, 0.1, 0.2, 1.0, 500.0)):
+        pkt.time = 1700000000 + t
+    wrpcap(pcap_file, packets)
+
+    for fast in (True, False):
+        stats = analyze_pcap(pcap_file, fast=fast, flow_timeout=60)
+        df = stats['flows'].to_dataframe()
+        assert len(df) == 3
+        first = df.iloc[0]
+        assert (first['src'], first['sport'], first['dst'], first['dport']) == (client, 40000, server, 80)
+        assert (first['packets_fwd'], first['packets_rev']) == (2, 1)
+        assert first['bytes_fwd'] == len(packets[0]) + len(packets[2])
+        assert first['tcp_flags'] == 'SA'
+        assert first['duration'] == pytest.approx(0.2)
+        assert df.iloc[2]['tcp_flags'] == 'F'
+        assert df.iloc[1]['proto'] == 17
+
+    expired = []
+    stats = analyze_pcap(pcap_file, flow_timeout=60, on_flow_expire=expired.append)
+    assert len(stats['flows']) == 0
+    assert [flow['dport'] for flow in expired] == [80, 53, 80]
+
+    csv_path = tmp_path / "flows.csv"
+    assert export_flows_csv(analyze_pcap(pcap_file, include_packets=False), str(csv_path))
+    assert len(pd.read_csv(csv_path)) == 3
+
+def test_analyze_pcaps_merges_rotated_files(tmp_path):
+    packets = []
+    for i in range(30):
+        if i % 3 == 2:
+            pkt = Ether()/IP(src=f"10.0.1.{i}", dst="10.0.0.1")/UDP(sport=5000 + i, dport=53)
+        elif i % 2:
+            pkt = Ether()/IP(src="10.0.0.2", dst="10.0.0.1")/TCP(sport=80, dport=40000, flags="A")
+        else:
+            pkt = Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/TCP(sport=40000, dport=80, flags="PA")
+        pkt.time = 1700000000 + i
+        packets.append(pkt)
+
+    capture_dir = tmp_path / "rotated"
+    capture_dir.mkdir()
+    whole = str(tmp_path / "whole.pcap")
+    wrpcap(whole, packets)
+    # tcpdump -C naming, written out of order
+    for n, chunk in ((2, packets[20:]), (0, packets[:10]), (1, packets[10:20])):
+        wrpcap(str(capture_dir / ("capture.pcap" + (str(n) if n else ""))), chunk)
+    (capture_dir / "notes.txt").write_text("not a capture")
+
+    expected = analyze_pcap(whole)
+    merged = analyze_pcaps(str(capture_dir), workers=2)
+
+    assert len(merged['files']) == 3
+    assert merged['packet_count'] == 30
+    for key in ('src_ips', 'dst_ips', 'top_ports', 'protocols'):
+        assert merged[key] == expected[key]
+    pd.testing.assert_frame_equal(merged['dataframe_data'], expected['dataframe_data'], check_categorical=False)
+    pd.testing.assert_frame_equal(merged['flows'].to_dataframe(), expected['flows'].to_dataframe())
+    assert len(merged['flows']) == 11
+
+def test_analyze_pcaps_flow_resumes_after_timeout(tmp_path):
+    def packet(t, sport):
+        pkt = Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/UDP(sport=sport, dport=53)
+        pkt.time = 1700000000 + t
+        return pkt
+
+    # A long-lived flow sits in front of a short one that resumes after the timeout
+    long_flow = [packet(t, 1111) for t in range(0, 1151, 50)]
+    short_flow = [packet(t, 2222) for t in (1, 2, 1100)]
+    whole = str(tmp_path / "whole.pcap")
+    wrpcap(whole, sorted(long_flow + short_flow, key=lambda pkt: pkt.time))
+
+    capture_dir = tmp_path / "captures"
+    capture_dir.mkdir()
+    wrpcap(str(capture_dir / "capture.pcap"), sorted(long_flow + short_flow[:2], key=lambda pkt: pkt.time))
+    wrpcap(str(capture_dir / "capture.pcap1"), short_flow[2:])
+
+    expected = analyze_pcap(whole)['flows'].to_dataframe()
+    merged = analyze_pcaps(str(capture_dir), workers=2)['flows'].to_dataframe()
+    assert list(merged['packets_fwd']) == [24, 2, 1]
+    pd.testing.assert_frame_equal(merged, expected)
+
+def test_analyze_pcap_time_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(pcap_analyzer, "TIME_INDEX_BLOCK", 2048)
+    start = 1700000000
+    packets = []
+    for i in range(600):
+        pkt = Ether()/IP(src="10.0.0.1", dst=f"10.0.{i // 100}.2")/UDP(sport=1000 + i, dport=53)
+        pkt.time = start + i
+        packets.append(pkt)
+
+    for name, writer in (("big.pcap", wrpcap), ("big.pcapng", wrpcapng)):
+        pcap_file = str(tmp_path / name)
+        writer(pcap_file, packets)
+        window = (start + 250, start + 259)
+
+        expected = analyze_pcap(pcap_file, time_range=window)
+        assert expected['packet_count'] == 10
+        assert not os.path.exists(pcap_file + ".tidx")
+
+        # First pass builds the index, later queries only read overlapping blocks
+        full = analyze_pcap(pcap_file, time_index=True)
+        assert full['packet_count'] == 600
+        with open(pcap_file + ".tidx") as f:
+            blocks = json.load(f)['blocks']
+        assert len(blocks) > 10
+        spans = list(pcap_analyzer._index_spans(blocks, window))
+        assert len(spans) == 1 and spans[0][1] - spans[0][0] < os.path.getsize(pcap_file) / 5
+
+        indexed = analyze_pcap(pcap_file, time_index=True, time_range=window)
+        pd.testing.assert_frame_equal(indexed['dataframe_data'], expected['dataframe_data'])
+        assert indexed['dst_ips'] == {"10.0.2.2": 10}
+
+        iso = analyze_pcap(pcap_file, time_index=True,
+                           time_range=("2023-11-14 22:17:30", pd.Timestamp(start + 259, unit="s")))
+        assert iso['packet_count'] == 10
+
+        csv_path = tmp_path / (name + ".csv")
+        assert export_pcap_csv(full, str(csv_path), time_range=(start + 595, None))
+        assert len(pd.read_csv(csv_path)) == 5
+
+    # A modified capture invalidates the index
+    writer(pcap_file, packets[:100])
+    assert analyze_pcap(pcap_file, time_index=True, time_range=window)['packet_count'] == 0
+    assert analyze_pcap(pcap_file, time_index=True, time_range=(start, start + 9))['packet_count'] == 10
+
+def test_analyze_pcap_parse_error_does_not_fall_back(tmp_path, monkeypatch):
+    pcap_file = str(tmp_path / "test.pcap")
+    wrpcap(pcap_file, [Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/UDP(dport=53) for _ in range(5)])
+    parse_frame = pcap_analyzer._parse_frame
+    calls = []
+
+    def failing_parse_frame(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise ValueError("corrupt frame")
+        return parse_frame(*args)
+
+    monkeypatch.setattr(pcap_analyzer, "_parse_frame", failing_parse_frame)
+    # An error partway through is reported, not retried with scapy on top of the packets already counted
+    assert analyze_pcap(pcap_file) is None
+    assert len(calls) == 3
+
+def test_analyze_pcap_malformed_ihl(tmp_path):
+    frame = bytearray(bytes(Ether()/IP(src="10.0.0.1", dst="10.0.0.2")/TCP(sport=1234, dport=80)))
+    frame[14] = 0x43  # version 4, IHL 3: shorter than the fixed header
+    pkt = Ether(bytes(frame))
+    pkt.time = 1700000000
+    pcap_file = str(tmp_path / "test.pcap")
+    wrpcap(pcap_file, [pkt])
+
+    fast = analyze_pcap(pcap_file)
+    slow = analyze_pcap(pcap_file, fast=False)
+    # No ports are read from inside the IP header
+    assert fast['top_ports'] == slow['top_ports'] == {}
+    assert fast['src_ips'] == slow['src_ips'] == {"10.0.0.1": 1}
+    pd.testing.assert_frame_equal(fast['dataframe_data'], slow['dataframe_data'])